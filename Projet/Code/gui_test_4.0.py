@@ -1,13 +1,25 @@
+import os
 import sys
 import math
-import serial
+import numpy as np
 import serial.tools.list_ports
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QGraphicsView, QGraphicsScene, QGraphicsEllipseItem,
-    QComboBox, QPushButton, QVBoxLayout, QWidget, QMessageBox, QDialog, QLabel, QHBoxLayout, QDockWidget
+    QApplication, QMainWindow, QGraphicsView, QGraphicsEllipseItem,
+    QComboBox, QCheckBox, QFileDialog, QPushButton, QVBoxLayout, QWidget, QMessageBox, QDialog, QLabel, QHBoxLayout, QDockWidget
 )
-from PyQt5.QtGui import QPen, QBrush, QColor, QImage, QPixmap, QPainter
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QPen, QPixmap, QPainter
+from PyQt5.QtCore import Qt, QRectF, QTimer
+
+# sonolib vive ao lado do projeto principal, em ../Projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Projeto"))
+from sonolib.acquisition import SerialAcquisition
+from sonolib.persistence import SweepBuffer
+from sonolib.qimage_bridge import array_to_qimage
+from sonolib.radar_scene import RadarScene, setup_radar_view
+from sonolib.raster_item import RasterItem
+from sonolib.recording import SweepRecorder
+from sonolib.render_scheduler import RenderScheduler
+from sonolib.scan_convert import ScanConverter
 
 
 class SerialPortSelector(QDialog):
@@ -21,11 +33,16 @@ class SerialPortSelector(QDialog):
         layout.addWidget(label)
 
         self.port_combo = QComboBox()
+        self.port_combo.setEditable(True)  # permite digitar um pty do sonolib.replay (ex.: /dev/pts/5)
         ports = serial.tools.list_ports.comports()
         for port in ports:
             self.port_combo.addItem(port.device)
         layout.addWidget(self.port_combo)
 
+        # Grava as varreduras brutas num arquivo .swp (lido por sonolib.replay e sonolib.report)
+        self.record_check = QCheckBox("Record raw sweeps to a file")
+        layout.addWidget(self.record_check)
+
         button_layout = QHBoxLayout()
         self.ok_button = QPushButton("OK")
         self.ok_button.clicked.connect(self.accept)
@@ -41,6 +58,9 @@ class SerialPortSelector(QDialog):
     def get_selected_port(self):
         return self.port_combo.currentText()
 
+    def wants_recording(self):
+        return self.record_check.isChecked()
+
 
 class RadarSimulator(QMainWindow):
     def __init__(self):
@@ -52,24 +72,37 @@ class RadarSimulator(QMainWindow):
         self.SIDE_LENGTH = 1000
         self.MAX_DISTANCE = 1000
         self.echoes = [0] * 80
-        self.points_by_angle = {}
+        self.PERSISTENCE_MODE = "replace"  # "replace", "decay" ou "last_k"
+        self.RENDER_MODE = "dots"  # "dots" ou "bmode" (imagem contínua interpolada)
+        self.DISPLAY_RATE = 30  # Hz, independente da taxa de aquisição
         self.acquisition_active = False
         self.captured_pixmap = None
+        self.captured_pixels = None  # (h, w, 4) BGRA da última captura, para processamento
 
         # Configuração gráfica
         self.view = QGraphicsView(self)
-        self.scene = QGraphicsScene(self)
+        self.scene = RadarScene(self)  # grade desenhada no fundo, em cache na view
         self.view.setScene(self.scene)
         self.setCentralWidget(self.view)
-        self.scene.setBackgroundBrush(Qt.black)
+        setup_radar_view(self.view)
 
         # Central do radar
         self.centerX = self.width() // 2
         self.centerY = self.height()
         self.radius = self.SIDE_LENGTH // 2
+        self.scene.set_grid((self.centerX, self.centerY), self.SIDE_LENGTH, self.radius)
+
+        # Imagem única onde as linhas de eco são desenhadas (em vez de uma elipse por amostra)
+        self.scan = ScanConverter((self.centerX, self.centerY), interpolate=self.RENDER_MODE == "bmode")
+        self.sweeps = SweepBuffer(mode=self.PERSISTENCE_MODE)  # últimos ecos de cada ângulo, tamanho fixo
+        self.raster_item = RasterItem(self.scan)
+        self.scene.addItem(self.raster_item)
 
-        # Conexão serial
-        self.serial_port = None
+        # Repinta no máximo DISPLAY_RATE vezes por segundo, só o setor alterado
+        self.renderer = RenderScheduler(self.sweeps, self.scan, self.raster_item, self.DISPLAY_RATE, parent=self)
+
+        # Conexão serial (a leitura acontece numa thread dedicada)
+        self.acquisition = None
         self.setup_serial_connection()
 
         # Botão para iniciar aquisição
@@ -89,10 +122,18 @@ class RadarSimulator(QMainWindow):
         selector = SerialPortSelector(self)
         if selector.exec_() == QDialog.Accepted:
             port_name = selector.get_selected_port()
+            recorder = None
+            if selector.wants_recording():
+                path, _ = QFileDialog.getSaveFileName(self, "Record Sweeps", "", "Sweep Recordings (*.swp)")
+                if path:
+                    recorder = SweepRecorder(path)  # fechado por acquisition.stop()
             try:
-                self.serial_port = serial.Serial(port_name, baudrate=115200, timeout=1)
+                self.acquisition = SerialAcquisition(port_name, recorder=recorder)
+                self.acquisition.start()
                 QMessageBox.information(self, "Success", f"Connected to {port_name}")
             except Exception as e:
+                if recorder is not None:
+                    recorder.close()
                 QMessageBox.critical(self, "Error", f"Failed to connect to {port_name}: {e}")
         else:
             QMessageBox.warning(self, "Warning", "No port selected. Running in simulation mode.")
@@ -103,82 +144,54 @@ class RadarSimulator(QMainWindow):
             return
 
         self.acquisition_active = True
+        if self.acquisition:
+            self.acquisition.drain()  # Descartar quadros recebidos antes do início
         self.timer.start(50)  # Iniciar leitura a cada 50ms
         self.scene.clear()  # Limpar a cena anterior
+        self.scan.clear()
+        self.sweeps.clear()
+        self.raster_item = RasterItem(self.scan)
+        self.scene.addItem(self.raster_item)
+        self.renderer.item = self.raster_item
+        self.renderer.start()
 
     def checkSerialData(self):
-        if not self.acquisition_active or not self.serial_port or not self.serial_port.is_open:
+        if not self.acquisition_active or not self.acquisition:
             return
 
-        try:
-            line = self.serial_port.readline().decode('utf-8').strip()
-            if not line:
-                return  # Ignorar linhas vazias
-
-            data = line.split(',')
-            if len(data) != 81:
-                print(f"Incomplete data received: {line}")
-                return  # Ignorar dados incompletos
-
-            # Processar os dados
-            angle = int(data[0])  # Primeiro valor é o ângulo
-            echoes = [int(value) if value.isdigit() else 0 for value in data[1:]]  # Ecos
-
-            # Atualizar o radar
-            self.updateRadar(angle, echoes)
+        frames = self.acquisition.drain()
 
-            # Capturar a cena ao atingir o ângulo -80
-            if angle == 29:
-                print("Acquisition complete: Angle -80 reached.")
-                self.captureScene()
-                self.timer.stop()
-                self.acquisition_active = False  # Parar aquisição
+        # Capturar a cena ao atingir o ângulo -80
+        end = np.flatnonzero(frames[:, 0] == 29)
+        if len(end):
+            frames = frames[:end[0] + 1]
 
-        except ValueError as e:
-            print(f"Error parsing data: {e}")
-        except Exception as e:
-            print(f"Unexpected error: {e}")
+        # Atualizar o radar
+        self.updateRadar(frames)
 
-    def updateRadar(self, angle, echoes):
-        if angle not in self.points_by_angle:
-            self.points_by_angle[angle] = []
+        if len(end):
+            print("Acquisition complete: Angle -80 reached.")
+            self.renderer.flush()  # desenhar as últimas linhas antes da captura
+            self.renderer.stop()
+            self.captureScene()
+            self.timer.stop()
+            self.acquisition_active = False  # Parar aquisição
 
-        points = self.points_by_angle[angle]
-
-        # Redesenhar os pontos para o ângulo atual
-        for n, distance in enumerate(echoes):
-            if n == 0 or distance <= 0:
-                continue
-
-            # Escala de distância
-            scaled_distance = n * 12.5
-            radian = math.radians(angle)
-            x = scaled_distance * math.sin(radian)
-            y = scaled_distance * math.cos(radian)
-
-            px = self.centerX + x
-            py = self.centerY - y
-
-            # Ajustar a cor com base na intensidade
-            intensity = min(max(distance, 0), 255)
-            color = QColor(intensity, intensity, intensity)  # Preto a branco
-
-            # Criar o ponto
-            ellipse = QGraphicsEllipseItem(px - 4, py - 4, 8, 8)
-            ellipse.setBrush(QBrush(color))
-            ellipse.setPen(QPen(Qt.NoPen))
-            self.scene.addItem(ellipse)
-
-            points.append(ellipse)
+    def updateRadar(self, frames):
+        # Só acumula as linhas de eco; o renderer desenha tudo de uma vez no próximo quadro
+        self.renderer.add_frames(frames)
 
     def captureScene(self):
         # Captura a cena como imagem
-        rect = self.scene.sceneRect()
-        image = QImage(int(rect.width()), int(rect.height()), QImage.Format_ARGB32)
+        # A imagem desenha direto num array NumPy, disponível sem cópia em self.captured_pixels
+        # A grade é desenhada no fundo, fora dos itens: a área capturada cobre os dois
+        rect = QRectF(self.scene.itemsBoundingRect().united(self.scene.grid_rect()).toAlignedRect())
+        self.captured_pixels = np.zeros((int(rect.height()), int(rect.width()), 4), dtype=np.uint8)
+        image = array_to_qimage(self.captured_pixels)
         image.fill(Qt.black)
 
         painter = QPainter(image)
-        self.scene.render(painter)
+        self.scene.render(painter, QRectF(image.rect()), rect)
         painter.end()
 
         # Salvar a imagem capturada
@@ -340,6 +353,12 @@ class RadarSimulator(QMainWindow):
         if event.key() == Qt.Key_Escape:
             self.close()
 
+    def closeEvent(self, event):
+        self.renderer.stop()
+        if self.acquisition:
+            self.acquisition.stop()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -1,14 +1,22 @@
+import os
 import sys
-import math
-import serial
 import serial.tools.list_ports
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QGraphicsView, QGraphicsScene, QGraphicsEllipseItem,
-    QComboBox, QPushButton, QVBoxLayout, QWidget, QMessageBox, QDialog, QLabel, QHBoxLayout
+    QApplication, QMainWindow, QGraphicsView,
+    QComboBox, QCheckBox, QFileDialog, QPushButton, QVBoxLayout, QWidget, QMessageBox, QDialog, QLabel, QHBoxLayout
 )
-from PyQt5.QtGui import QPen, QBrush, QColor
 from PyQt5.QtCore import Qt, QTimer
 
+# sonolib vive ao lado do projeto principal, em ../Projeto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Projeto"))
+from sonolib.acquisition import SerialAcquisition
+from sonolib.persistence import SweepBuffer
+from sonolib.radar_scene import RadarScene, setup_radar_view
+from sonolib.raster_item import RasterItem
+from sonolib.recording import SweepRecorder
+from sonolib.render_scheduler import RenderScheduler
+from sonolib.scan_convert import ScanConverter
+
 
 class SerialPortSelector(QDialog):
     def __init__(self, parent=None):
@@ -21,11 +29,16 @@ class SerialPortSelector(QDialog):
         layout.addWidget(label)
 
         self.port_combo = QComboBox()
+        self.port_combo.setEditable(True)  # permite digitar um pty do sonolib.replay (ex.: /dev/pts/5)
         ports = serial.tools.list_ports.comports()
         for port in ports:
             self.port_combo.addItem(port.device)
         layout.addWidget(self.port_combo)
 
+        # Grava as varreduras brutas num arquivo .swp (lido por sonolib.replay e sonolib.report)
+        self.record_check = QCheckBox("Record raw sweeps to a file")
+        layout.addWidget(self.record_check)
+
         button_layout = QHBoxLayout()
         self.ok_button = QPushButton("OK")
         self.ok_button.clicked.connect(self.accept)
@@ -41,6 +54,9 @@ class SerialPortSelector(QDialog):
     def get_selected_port(self):
         return self.port_combo.currentText()
 
+    def wants_recording(self):
+        return self.record_check.isChecked()
+
 
 class RadarSimulator(QMainWindow):
     def __init__(self):
@@ -55,123 +71,91 @@ class RadarSimulator(QMainWindow):
         self.MAX_DISTANCE = 1000
         self.angle = 0
         self.echoes = [0] * 80
-        self.points_by_angle = {}
+        self.PERSISTENCE_MODE = "replace"  # "replace", "decay" ou "last_k"
+        self.RENDER_MODE = "dots"  # "dots" ou "bmode" (imagem contínua interpolada)
+        self.DISPLAY_RATE = 30  # Hz, independente da taxa de aquisição
 
         # Configuração gráfica
         self.view = QGraphicsView(self)
-        self.scene = QGraphicsScene(self)
+        self.scene = RadarScene(self)  # grade desenhada no fundo, em cache na view
         self.view.setScene(self.scene)
         self.setCentralWidget(self.view)
-        self.scene.setBackgroundBrush(Qt.black)
+        setup_radar_view(self.view)
 
         # Central do radar
         self.centerX = self.width() // 2
         self.centerY = self.height()
         self.radius = self.SIDE_LENGTH // 2
+        self.scene.set_grid((self.centerX, self.centerY), self.SIDE_LENGTH, self.radius, self.ANGLE_BOUNDS)
+
+        # Imagem única onde as linhas de eco são desenhadas (em vez de uma elipse por amostra)
+        self.scan = ScanConverter((self.centerX, self.centerY), interpolate=self.RENDER_MODE == "bmode")
+        self.sweeps = SweepBuffer(mode=self.PERSISTENCE_MODE)  # últimos ecos de cada ângulo, tamanho fixo
+        self.raster_item = RasterItem(self.scan)
+        self.scene.addItem(self.raster_item)
+
+        # Repinta no máximo DISPLAY_RATE vezes por segundo, só o setor alterado
+        self.renderer = RenderScheduler(self.sweeps, self.scan, self.raster_item, self.DISPLAY_RATE, parent=self)
 
-        # Conexão serial
-        self.serial_port = None
+        # Conexão serial (a leitura acontece numa thread dedicada)
+        self.acquisition = None
         self.setup_serial_connection()
 
         # Timer para atualização
         self.timer = QTimer()
         self.timer.timeout.connect(self.updateRadar)
-        self.timer.start(50)  # Atualiza a cada 50ms
+        self.timer.start(10)  # Recolhe os quadros a cada 10ms; a repintura segue DISPLAY_RATE
+        self.renderer.start()
 
     def setup_serial_connection(self):
         selector = SerialPortSelector(self)
         if selector.exec_() == QDialog.Accepted:
             port_name = selector.get_selected_port()
+            recorder = None
+            if selector.wants_recording():
+                path, _ = QFileDialog.getSaveFileName(self, "Record Sweeps", "", "Sweep Recordings (*.swp)")
+                if path:
+                    recorder = SweepRecorder(path)  # fechado por acquisition.stop()
             try:
-                self.serial_port = serial.Serial(port_name, baudrate=115200, timeout=1)
+                self.acquisition = SerialAcquisition(port_name, recorder=recorder)
+                self.acquisition.start()
                 QMessageBox.information(self, "Success", f"Connected to {port_name}")
             except Exception as e:
+                if recorder is not None:
+                    recorder.close()
                 QMessageBox.critical(self, "Error", f"Failed to connect to {port_name}: {e}")
         else:
             QMessageBox.warning(self, "Warning", "No port selected. Running in simulation mode.")
 
     def read_serial_data(self):
-        if self.serial_port and self.serial_port.is_open:
-            try:
-                line = self.serial_port.readline().decode('utf-8').strip()
-
-                if not line:
-                    print("Empty line received, treating as no data.")
-                    return  # Ignorar se a linha estiver completamente vazia
-
-                data = line.split(',')
-                if len(data) < 81:
-                    print(f"Incomplete data received: {line}, filling with zeros.")
-                    # Completar com zeros para ter 80 valores
-                    data += ['0'] * (81 - len(data))
-
-                # Processar os dados
-                self.angle = int(data[0])  # Primeiro valor é o ângulo
-                self.echoes = [
-                    int(value) if value.isdigit() else 0 for value in data[1:]
-                ]  # Substituir valores inválidos por 0
-
-            except ValueError as e:
-                print(f"Error parsing data: {e}, line: {line}")
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-
-    def drawRadar(self):
-        pen = QPen(Qt.gray)
-        for i in range(0, self.SIDE_LENGTH // 100 + 1):
-            radius = 100 * i
-            self.scene.addEllipse(self.centerX - radius, self.centerY - radius, 2 * radius, 2 * radius, pen)
-
-        for i in range(0, self.ANGLE_BOUNDS * 2 // 20 + 1):
-            angle = -self.ANGLE_BOUNDS + i * 20
-            rad_angle = math.radians(angle)
-            x = self.centerX + self.radius * math.sin(rad_angle)
-            y = self.centerY - self.radius * math.cos(rad_angle)
-            self.scene.addLine(self.centerX, self.centerY, x, y, pen)
-
-    def drawObjects(self):
-        if self.angle not in self.points_by_angle:
-            self.points_by_angle[self.angle] = []
-
-        points = self.points_by_angle[self.angle]
-
-        for n, distance in enumerate(self.echoes):
-            if n == 0 or distance <= 0:
-                continue
-
-            # Escala de distância igual ao Processing
-            scaled_distance = n * 12.5
-            radian = math.radians(self.angle)
-            x = scaled_distance * math.sin(radian)
-            y = scaled_distance * math.cos(radian)
-
-            px = self.centerX + x
-            py = self.centerY - y
-
-            # Ajustar a cor com base na intensidade (escala de cinza)
-            intensity = min(max(distance, 0), 255)  # Garantir valores entre 0 e 255
-            color = QColor(intensity, intensity, intensity)  # Matiz de preto a branco
-
-            # Debugging: imprimir os valores calculados
-            print(f"Angle: {self.angle}, Scaled Distance: {scaled_distance}, Point: ({px}, {py}), Intensity: {intensity}")
-
-            # Criar o ponto no radar
-            ellipse = QGraphicsEllipseItem(px - 4, py - 4, 8, 8)
-            ellipse.setBrush(QBrush(color))
-            ellipse.setPen(QPen(Qt.NoPen))
-            self.scene.addItem(ellipse)
-
-            points.append(ellipse)
+        # Nunca bloqueia: apenas recolhe os quadros já lidos pela thread de aquisição
+        if not self.acquisition:
+            return []
+        frames = self.acquisition.drain()
+        if len(frames):
+            self.angle = int(frames[-1, 0])
+            self.echoes = frames[-1, 1:]
+        return frames
+
+    def drawObjects(self, frames):
+        # Escala de distância igual ao Processing (n * 12.5), intensidade em escala de cinza;
+        # desenhado pelo renderer no próximo quadro
+        self.renderer.add_frames(frames)
 
     def updateRadar(self):
-        self.read_serial_data()
-        self.drawRadar()
-        self.drawObjects()
+        frames = self.read_serial_data()
+        self.drawObjects(frames)
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Escape:
             self.close()
 
+    def closeEvent(self, event):
+        self.renderer.stop()
+        if self.acquisition:
+            self.acquisition.stop()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1 @@
+"""Shared acquisition, processing and rendering code for the ultrasonogram tools."""
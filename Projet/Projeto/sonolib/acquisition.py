@@ -0,0 +1,104 @@
+"""
+Background serial acquisition.
+
+The worker owns the serial port and reads it continuously on its own thread,
+so the GUI never blocks on readline(). Complete sweep frames are handed over
+through a bounded queue that the GUI drains whenever it wants to draw. Each
+frame is one row of 81 ints: the angle followed by the 80 echoes.
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+import serial
+
+from .framing import SweepDecoder
+from .parsing import N_FIELDS
+
+BAUD_RATE = 115200
+
+
+class SerialAcquisition:
+    def __init__(self, port_name, baudrate=BAUD_RATE, max_frames=1024, on_frames=None, recorder=None,
+                 on_error=None):
+        self.port_name = port_name
+        self.baudrate = baudrate
+        self.on_frames = on_frames  # called from the worker thread, keep it cheap
+        self.on_error = on_error    # called from the worker thread with the exception that stopped it
+        self.recorder = recorder    # optional SweepRecorder, every parsed frame is written to it
+
+        self.serial_port = None
+        self.frames = collections.deque(maxlen=max_frames)
+        self.dropped = 0    # frames lost because the GUI did not drain in time
+        self.malformed = 0  # lines that could not be parsed
+        self.error = None
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Open the port in the caller so that connection errors reach the dialog
+        self.serial_port = serial.Serial(self.port_name, baudrate=self.baudrate, timeout=0.1)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="serial-acquisition", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            if self._thread.is_alive() and self.serial_port is not None:
+                self.serial_port.close()  # a read still blocked returns (or fails) once the port is closed
+            self._thread.join()  # the worker may be appending to the recorder until it is gone
+            self._thread = None
+        if self.serial_port is not None and self.serial_port.is_open:
+            self.serial_port.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        decoder = SweepDecoder()  # CSV or binary frames, detected from the data
+        while not self._stop.is_set():
+            try:
+                chunk = self.serial_port.read(self.serial_port.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError) as e:
+                if not self._stop.is_set():  # closed by stop(): not an error
+                    self.error = e
+                    if self.on_error:
+                        self.on_error(e)
+                break
+            if not chunk:
+                continue
+
+            frames, malformed = decoder.feed(chunk)
+            if malformed.any():
+                self.malformed += int(malformed.sum())
+                frames = frames[~malformed]
+            if len(frames):
+                if self.recorder is not None:
+                    self.recorder.append(frames, time.monotonic())
+                self._push(frames)
+
+    def _push(self, frames):
+        with self._lock:
+            overflow = len(self.frames) + len(frames) - self.frames.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self.frames.extend(frames)
+        if self.on_frames:
+            self.on_frames()
+
+    def drain(self):
+        """Returns every frame received since the last call as an (n, 81) array, oldest first."""
+        with self._lock:
+            frames = list(self.frames)
+            self.frames.clear()
+        if not frames:
+            return np.zeros((0, N_FIELDS), dtype=np.int32)
+        return np.stack(frames)
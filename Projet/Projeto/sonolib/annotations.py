@@ -0,0 +1,125 @@
+"""
+Id-keyed registry of the analyzer's annotations.
+
+An annotation is one user object made of one or more scene items: a text box
+(its QGraphicsTextItem), or a measurement (its line, its distance label and
+its row in the MeasurementStore). Every item carries its annotation id in
+QGraphicsItem.data(ANNOTATION_ID), so going from a selected item to the whole
+annotation, and from an id to its items or record, is a dict lookup instead
+of a scan of the scene. The items are also kept by role (text boxes,
+measurement lines, distance labels), for style changes that touch every item
+of a type.
+"""
+
+import itertools
+
+from .measurements import MeasurementStore
+
+ANNOTATION_ID = 0  # QGraphicsItem.data() key holding the annotation id
+ROLES = {"text": ("text",), "measurement": ("line", "distance")}  # kind -> role of each item
+
+
+class Annotation:
+    def __init__(self, annotation_id, kind, items, record=None):
+        self.id = annotation_id
+        self.kind = kind        # "text" or "measurement"
+        self.items = items      # scene items, e.g. [line, label]
+        self.record = record    # MeasurementStore.append() arguments, for measurements
+
+    @property
+    def line(self):
+        return self.items[0] if self.kind == "measurement" else None
+
+    @property
+    def label(self):
+        return self.items[-1]
+
+
+class AnnotationRegistry:
+    """
+    `measurements` holds the records of the measurements that are shown,
+    under their annotation ids; it is what the report reads, kept in step
+    with the annotations. Registries of several images may share one store
+    and one `ids` counter, so ids stay unique in the store.
+    """
+
+    def __init__(self, measurements=None, ids=None):
+        self.annotations = {}
+        self.measurements = measurements if measurements is not None else MeasurementStore()
+        self.ids = ids if ids is not None else itertools.count()
+        self.by_role = {role: {} for roles in ROLES.values() for role in roles}  # role -> id -> item
+
+    def __len__(self):
+        return len(self.annotations)
+
+    def __iter__(self):
+        return iter(self.annotations.values())
+
+    def __contains__(self, annotation_id):
+        return annotation_id in self.annotations
+
+    def new(self, kind, items, record=None):
+        """Annotation with a fresh id, not registered yet (see restore)."""
+        annotation = Annotation(next(self.ids), kind, list(items), record)
+        return annotation
+
+    def add(self, kind, items, record=None):
+        annotation = self.new(kind, items, record)
+        self.restore(annotation)
+        return annotation
+
+    def restore(self, annotation):
+        """Puts back a removed annotation under its old id (undo)."""
+        for item in annotation.items:
+            item.setData(ANNOTATION_ID, annotation.id)
+        self.annotations[annotation.id] = annotation
+        if annotation.record is not None and not self.measurements.restore(annotation.id):
+            self.measurements.append(annotation.id, **annotation.record)
+        for role, item in zip(ROLES[annotation.kind], annotation.items):
+            self.by_role[role][annotation.id] = item
+
+    def remove(self, annotation_id):
+        annotation = self.annotations.pop(annotation_id)
+        if annotation_id in self.measurements:
+            self.measurements.remove(annotation_id)
+        for role in ROLES[annotation.kind]:
+            self.by_role[role].pop(annotation_id, None)
+        return annotation
+
+    def get(self, annotation_id):
+        return self.annotations.get(annotation_id)
+
+    def for_item(self, item):
+        """Annotation an item belongs to, or None for items that are not annotations."""
+        annotation_id = item.data(ANNOTATION_ID)
+        if annotation_id is None:
+            return None
+        return self.annotations.get(annotation_id)
+
+    def for_items(self, items):
+        """Distinct annotations of a list of items (e.g. a selection), in order."""
+        found = {}
+        for item in items:
+            annotation = self.for_item(item)
+            if annotation is not None:
+                found.setdefault(annotation.id, annotation)
+        return list(found.values())
+
+    def of_kind(self, kind):
+        return [a for a in self.annotations.values() if a.kind == kind]
+
+    def items(self, *roles):
+        """Items of the given roles ("text", "line", "distance"), e.g. items("line")."""
+        return [item for role in roles for item in self.by_role[role].values()]
+
+    def labels(self):
+        """Every text item: text boxes and measurement labels."""
+        return self.items("text", "distance")
+
+    def clear(self):
+        for annotation_id in self.annotations:
+            if annotation_id in self.measurements:
+                self.measurements.remove(annotation_id)  # only ours, the store may be shared
+        self.annotations.clear()
+        for items in self.by_role.values():
+            items.clear()
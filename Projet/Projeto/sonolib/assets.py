@@ -0,0 +1,91 @@
+"""
+Content-addressed store for report and export images.
+
+An image is stored once, under a hash of its pixels (shape, type and bytes):
+
+    store = AssetStore("reports/assets")
+    path = store.put(pixels)              # reports/assets/3f/3fa2...c1.png
+    thumb = store.thumbnail(path, 160)    # reports/assets/3f/3fa2...c1-160.png
+
+Putting an image that is already there costs the hash only, so reports that
+share a base image point at one file, and regenerating a report after an
+edit writes only the image that changed. Variants (thumbnails, downscaled
+copies) are named after the hash of their source plus their size, so they
+are found without decoding or hashing anything. Files are written to a
+temporary name and renamed, so concurrent writers (the batch reporter's
+processes) never leave or read a half-written file.
+"""
+import hashlib
+import os
+import urllib.parse
+
+import numpy as np
+from PIL import Image
+
+EXTENSION = ".png"
+
+
+def pixel_key(pixels, tag=""):
+    """Hex hash of an image's pixels; `tag` tells apart formats with the same bytes."""
+    pixels = np.ascontiguousarray(pixels)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{pixels.shape}{pixels.dtype.str}{tag}".encode())
+    digest.update(memoryview(pixels).cast("B"))
+    return digest.hexdigest()
+
+
+def file_key(path):
+    """
+    Hex hash standing for a file's content without reading it (path, size,
+    modification time), for images too large to hash, e.g. tiled scans.
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{os.path.abspath(path)}{stat.st_size}{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def relative_url(path, start):
+    """URL of a stored file relative to the page in directory `start`."""
+    return urllib.parse.quote(os.path.relpath(path, start or os.curdir).replace(os.sep, "/"))
+
+
+def write_atomic(path, write):
+    """Calls write(temporary path), then renames the result to `path`."""
+    temporary = f"{path}.{os.getpid()}.part{os.path.splitext(path)[1]}"
+    write(temporary)
+    os.replace(temporary, path)
+
+
+class AssetStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key, variant=None):
+        name = key if variant is None else f"{key}-{variant}"
+        return os.path.join(self.root, key[:2], name + EXTENSION)
+
+    def reserve(self, key, variant=None):
+        """Path of `key` and whether it still has to be written (its directory is created)."""
+        path = self.path(key, variant)
+        if os.path.exists(path):
+            return path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path, True
+
+    def put(self, pixels, tag=""):
+        """Stores a uint8 (h, w) or (h, w, 3/4) array as PNG, once; returns its path."""
+        path, missing = self.reserve(pixel_key(pixels, tag))
+        if missing:
+            write_atomic(path, lambda target: Image.fromarray(pixels).save(target, "PNG", compress_level=1))
+        return path
+
+    def thumbnail(self, path, max_size):
+        """Copy of a stored image fitting in max_size x max_size, made once per source and size."""
+        key = os.path.splitext(os.path.basename(path))[0]
+        target = self.path(key, max_size)
+        if not os.path.exists(target):
+            with Image.open(path) as image:
+                image.thumbnail((max_size, max_size))
+                write_atomic(target, lambda name: image.save(name, "PNG"))
+        return target
@@ -0,0 +1,209 @@
+"""
+Echo boundary detection and automatic caliper measurements, NumPy only.
+
+Works on A-lines, an (angles x bins) array: SweepBuffer.data straight from
+the acquisition, or sample_alines() of a scan-converted image. On each
+A-line, bins above a noise threshold that are the maximum of their
+neighbourhood are echo boundaries (refined to a fraction of a bin). A
+boundary found again on neighbouring angles is one reflecting surface; each
+surface gives one caliper, from it to the next boundary behind it on its
+middle A-line, i.e. one measurement per structure instead of one per line:
+
+    calipers = find_calipers(sweeps.data, sweeps.angles)
+    lengths = calipers["length_mm"]
+
+Physical units come from the sampling: one bin is one analogRead on the
+Arduino Uno (about 112 us at the default ADC clock), during which the
+HC-SR04 pulse travels there and back at the speed of sound in air.
+"""
+import numpy as np
+
+from .geometry import ANGLE_BOUNDS, BIN_SPACING
+from .parsing import N_ECHOES
+
+SPEED_OF_SOUND = 343.0   # m/s, air at 20 °C
+SAMPLE_PERIOD_US = 112   # µs per echo sample (analogRead, 16 MHz / 128 prescaler)
+MM_PER_BIN = SPEED_OF_SOUND * SAMPLE_PERIOD_US / 1000 / 2  # round trip: ~19.2 mm
+MM_PER_UNIT = MM_PER_BIN / BIN_SPACING  # per scene unit, i.e. per image pixel of a rendered sweep
+
+SKIP_BINS = 3     # ringing of the transducer right after the trigger, never an echo
+MIN_GAP = 2       # bins between two boundaries of the same A-line
+TOLERANCE = 1.0   # bins a surface may drift between neighbouring angles
+MIN_LINES = 3     # angles a surface must cover to be measured
+
+CALIPER_DTYPE = np.dtype([
+    ("angle", np.int32),        # A-line of the measurement, degrees
+    ("start", np.float64),      # boundary positions, in bins from the probe
+    ("end", np.float64),
+    ("length_mm", np.float64),
+])
+
+
+def scanned_lines(lines, min_fraction=0.0):
+    """
+    A-lines that received something (the firmware sweeps +-40 of the +-80
+    degree buffer): more than `min_fraction` of their samples not zero. Raw
+    echoes of an unscanned angle are all zero; A-lines read back from an
+    image still cross the grid there, so take 0.5 for those.
+    """
+    lines = np.asarray(lines)
+    return np.count_nonzero(lines, axis=1) > min_fraction * lines.shape[1]
+
+
+def noise_threshold(lines, k=4.0, scanned=None):
+    """
+    Median + k robust standard deviations (MAD) of the samples of the
+    scanned A-lines (default: the lines not all zero); at least 1.
+    """
+    lines = np.asarray(lines, dtype=np.float32)
+    if scanned is None:
+        scanned = scanned_lines(lines)
+    samples = lines[scanned].ravel()
+    if len(samples) == 0:
+        return 1.0
+    median = np.median(samples)
+    mad = np.median(np.abs(samples - median)) * 1.4826
+    return max(float(median + k * mad), 1.0)
+
+
+def find_boundaries(lines, threshold=None, skip_bins=SKIP_BINS, min_gap=MIN_GAP, scanned=None):
+    """
+    Echo boundaries of every scanned A-line at once: (line, position)
+    arrays, sorted by line then position, positions in (fractional) bins.
+    """
+    lines = np.asarray(lines, dtype=np.float32)
+    if scanned is None:
+        scanned = scanned_lines(lines)
+    if threshold is None:
+        threshold = noise_threshold(lines, scanned=scanned)
+    n_bins = lines.shape[1]
+
+    # Maximum over +-min_gap bins; a peak is a sample equal to it and above
+    # the previous sample (the first bin of a plateau)
+    padded = np.pad(lines, ((0, 0), (min_gap, min_gap)), constant_values=-np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * min_gap + 1, axis=1)
+    rising = lines > padded[:, min_gap - 1:min_gap - 1 + n_bins]
+    peaks = (lines >= threshold) & (lines == windows.max(axis=2)) & rising
+    peaks[:, :skip_bins] = False
+    peaks[~np.asarray(scanned, dtype=bool)] = False  # never received, nothing to find
+
+    line, peak = np.nonzero(peaks)
+    # Parabola through the peak and its neighbours for the sub-bin position
+    left = lines[line, np.maximum(peak - 1, 0)]
+    centre = lines[line, peak]
+    right = lines[line, np.minimum(peak + 1, n_bins - 1)]
+    curvature = left - 2 * centre + right
+    offset = np.divide(left - right, 2 * curvature, out=np.zeros_like(curvature), where=curvature < 0)
+    return line, peak + np.clip(offset, -0.5, 0.5).astype(np.float64)
+
+
+def trace_surfaces(line, position, n_lines, tolerance=TOLERANCE):
+    """
+    Links boundaries of neighbouring A-lines that are within `tolerance` bins
+    into surfaces; returns the surface label of each boundary.
+    """
+    labels = np.full(len(line), -1, dtype=np.intp)
+    bounds = np.searchsorted(line, np.arange(n_lines + 1))
+    next_label = 0
+    for i in range(n_lines):
+        current = slice(bounds[i], bounds[i + 1])
+        count = current.stop - current.start
+        if count == 0:
+            continue
+        own = np.full(count, -1, dtype=np.intp)
+        if i > 0 and bounds[i] > bounds[i - 1]:
+            previous = slice(bounds[i - 1], bounds[i])
+            distance = np.abs(position[current][:, None] - position[previous][None, :])
+            nearest = distance.argmin(axis=1)
+            gap = distance[np.arange(count), nearest]
+            # Closest pairs first, each previous boundary continues one surface at most
+            order = np.argsort(gap, kind="stable")
+            order = order[gap[order] <= tolerance]
+            _, first = np.unique(nearest[order], return_index=True)
+            linked = order[first]
+            own[linked] = labels[previous][nearest[linked]]
+        new = own < 0
+        own[new] = np.arange(next_label, next_label + new.sum())
+        next_label += int(new.sum())
+        labels[current] = own
+    return labels
+
+
+def find_calipers(lines, angles=None, threshold=None, skip_bins=SKIP_BINS, min_gap=MIN_GAP,
+                  tolerance=TOLERANCE, min_lines=MIN_LINES, mm_per_bin=MM_PER_BIN, scanned=None):
+    """
+    One caliper per surface seen on at least `min_lines` angles: on the
+    surface's middle A-line, from its boundary to the next one behind it
+    (surfaces with nothing behind them give no caliper). Returns a
+    CALIPER_DTYPE array sorted by angle then depth. `scanned` marks the
+    A-lines actually received (e.g. SweepBuffer.seen); by default the
+    lines that are not all zero.
+    """
+    lines = np.asarray(lines)
+    if angles is None:
+        angles = np.arange(len(lines)) - len(lines) // 2
+    line, position = find_boundaries(lines, threshold, skip_bins, min_gap, scanned)
+    if len(line) == 0:
+        return np.zeros(0, dtype=CALIPER_DTYPE)
+    labels = trace_surfaces(line, position, len(lines), tolerance)
+
+    # Boundaries come sorted by line, so a surface's middle boundary is at
+    # first + count // 2 once grouped by label (stable sort keeps line order)
+    order = np.argsort(labels, kind="stable")
+    _, first, count = np.unique(labels[order], return_index=True, return_counts=True)
+    middle = order[first + count // 2][count >= min_lines]
+
+    # The next boundary on the same A-line is the next one in the sorted arrays
+    has_next = middle + 1 < len(line)
+    middle = middle[has_next]
+    behind = middle + 1
+    same_line = line[behind] == line[middle]
+    middle, behind = middle[same_line], behind[same_line]
+
+    calipers = np.zeros(len(middle), dtype=CALIPER_DTYPE)
+    calipers["angle"] = np.asarray(angles)[line[middle]]
+    calipers["start"] = position[middle]
+    calipers["end"] = position[behind]
+    calipers["length_mm"] = (position[behind] - position[middle]) * mm_per_bin
+    return np.sort(calipers, order=("angle", "start"))
+
+
+def caliper_name(caliper):
+    """Default name of an automatic measurement, e.g. "Auto -12° at 384 mm"."""
+    return f"Auto {caliper['angle']}° at {caliper['start'] * MM_PER_BIN:.0f} mm"
+
+
+def caliper_points(calipers, center, bin_spacing=BIN_SPACING):
+    """(n, 4) x0, y0, x1, y1 scene coordinates of the calipers' ends (radar origin at `center`)."""
+    radians = np.radians(calipers["angle"])[:, None]
+    ranges = np.stack([calipers["start"], calipers["end"]], axis=1) * bin_spacing
+    x = center[0] + ranges * np.sin(radians)
+    y = center[1] - ranges * np.cos(radians)
+    return np.stack([x[:, 0], y[:, 0], x[:, 1], y[:, 1]], axis=1)
+
+
+def sample_alines(image, center, angle_bounds=ANGLE_BOUNDS, n_bins=N_ECHOES,
+                  bin_spacing=BIN_SPACING, samples_per_bin=8, background=None):
+    """
+    A-lines back from a scan-converted (height, width) grayscale image, one
+    per whole degree. Each bin is the mean of `samples_per_bin` pixels along
+    its ray, which keeps the thin grid rings far below any echo. Points off
+    the image read 0. `background` is what the echoes were drawn over (the
+    grid of export.draw_grid): pixels still showing it are left out of the
+    means, so the bearing lines and their labels do not read as echoes.
+    """
+    height, width = image.shape
+    angles = np.radians(np.arange(-angle_bounds, angle_bounds + 1))[:, None, None]
+    steps = (np.arange(samples_per_bin) + 0.5) / samples_per_bin - 0.5
+    ranges = ((np.arange(n_bins)[:, None] + steps[None, :]) * bin_spacing)[None]
+    x = np.rint(center[0] + ranges * np.sin(angles)).astype(np.intp)
+    y = np.rint(center[1] - ranges * np.cos(angles)).astype(np.intp)
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    y, x = np.clip(y, 0, height - 1), np.clip(x, 0, width - 1)
+    values = np.where(inside, image[y, x], 0)
+    if background is None:
+        return values.mean(axis=2, dtype=np.float32)
+    under = background[y, x]
+    kept = inside & ((under == 0) | (values != under))
+    total = np.where(kept, values, 0).sum(axis=2, dtype=np.float32)
+    return total / np.maximum(kept.sum(axis=2), 1)
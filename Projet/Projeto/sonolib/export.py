@@ -0,0 +1,221 @@
+"""
+Headless sweep-to-image export, NumPy + Pillow only (no Qt, no display):
+
+    python -m sonolib.export session.swp -o images/
+    python -m sonolib.export capture.csv -o images/ --mode bmode --format npy --last
+
+The image has the viewers' layout (radar origin at the bottom centre of a
+1920x1024 canvas, 1 pixel per scene unit, gray grid and angle labels), so
+files produced on a server match what captureScene/save_scene_as_image give
+on a desktop. From Python:
+
+    image = render_image(sweep_buffer)
+    save_image(image, "sweep.png")
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .geometry import ANGLE_BOUNDS
+from .persistence import SweepBuffer
+from .replay import iter_source
+from .scan_convert import ScanConverter
+
+CANVAS_SIZE = (1920, 1024)
+SIDE_LENGTH = 1000
+GRID_LEVEL = 160  # Qt.gray
+FORMATS = ("png", "raw", "npy")
+
+
+def draw_grid(size=CANVAS_SIZE, side_length=SIDE_LENGTH, angle_bounds=ANGLE_BOUNDS,
+              ring_step=100, bearing_step=20):
+    """Grayscale (height, width) array with the grid RadarScene draws in its background."""
+    width, height = size
+    cx, cy = width // 2, height
+    line_length = side_length // 2
+    image = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(image)
+    for radius in range(ring_step, side_length + 1, ring_step):
+        draw.ellipse((cx - radius, cy - radius, cx + radius, cy + radius), outline=GRID_LEVEL)
+    for angle in range(-angle_bounds, angle_bounds + 1, bearing_step):
+        rad_angle = math.radians(angle)
+        x = cx + line_length * math.sin(rad_angle)
+        y = cy - line_length * math.cos(rad_angle)
+        draw.line((cx, cy, x, y), fill=GRID_LEVEL)
+        draw.text((x, y - 13), f"{angle}°", fill=GRID_LEVEL, anchor="mm")
+    return np.asarray(image)
+
+
+class SweepImageRenderer:
+    """
+    Renders SweepBuffer contents onto a fixed canvas. The scan converter and
+    the grid are built once, so rendering many sweeps costs one scan
+    conversion and one composite each.
+    """
+
+    def __init__(self, size=CANVAS_SIZE, mode="dots", grid=True, angle_bounds=ANGLE_BOUNDS):
+        width, height = size
+        self.shape = (height, width)
+        self.scan = ScanConverter((width // 2, height), angle_bounds=angle_bounds,
+                                  interpolate=mode == "bmode")
+        if grid:
+            self.background = draw_grid(size, angle_bounds=angle_bounds)
+        else:
+            self.background = np.zeros(self.shape, dtype=np.uint8)
+
+        # Part of the scan buffer that falls on the canvas
+        ox, oy = self.scan.origin
+        bh, bw = self.scan.shape
+        x0, y0 = max(ox, 0), max(oy, 0)
+        x1, y1 = min(ox + bw, width), min(oy + bh, height)
+        self.canvas_slice = (slice(y0, y1), slice(x0, x1))
+        self.buffer_slice = (slice(y0 - oy, y1 - oy), slice(x0 - ox, x1 - ox))
+
+    def render(self, sweeps, out=None):
+        """(height, width) uint8 image of a SweepBuffer; level 0 echoes show the grid."""
+        sweeps.dirty.fill(True)  # the converter keeps its own buffer: redraw every angle
+        self.scan.clear()
+        self.scan.draw_sweeps(sweeps)
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        out[...] = self.background
+        echoes = self.scan.buffer[self.buffer_slice]
+        canvas = out[self.canvas_slice]
+        np.copyto(canvas, echoes, where=echoes > 0)
+        return out
+
+
+def render_image(sweeps, size=CANVAS_SIZE, mode="dots", grid=True):
+    """One-shot helper: SweepBuffer in, grayscale image array out."""
+    return SweepImageRenderer(size, mode, grid, sweeps.angle_bounds).render(sweeps)
+
+
+def save_image(image, path, fmt=None):
+    """
+    Writes a (height, width) uint8 array as PNG, as headerless 8-bit raw
+    bytes (row major) or as .npy; the format defaults to the file extension.
+    """
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip(".").lower() or "png"
+    if fmt == "png":
+        Image.fromarray(image, "L").save(path)
+    elif fmt == "raw":
+        np.ascontiguousarray(image).tofile(path)
+    elif fmt == "npy":
+        np.save(path, image)
+    else:
+        raise ValueError(f"Unknown image format: {fmt}")
+
+
+class SweepSplitter:
+    """
+    Cuts a stream of (n, 81) rows into sweeps: a sweep ends where the angle
+    changes direction (the firmware scans back and forth between the bounds).
+    """
+
+    def __init__(self):
+        self.pending = []  # rows of the sweep in progress
+        self.last_angle = None
+        self.direction = 0
+        self.count = 0  # sweeps completed so far
+
+    def feed(self, rows):
+        """Returns the list of sweeps completed by these rows, oldest first."""
+        rows = np.asarray(rows)
+        if len(rows) == 0:
+            return []
+        angles = rows[:, 0]
+        step = np.sign(np.diff(angles, prepend=angles[0] if self.last_angle is None else self.last_angle))
+        # Direction of travel at each row, carrying it over rows that repeat an angle
+        steps = np.concatenate([[self.direction], step])
+        index = np.where(steps != 0, np.arange(len(steps)), 0)
+        np.maximum.accumulate(index, out=index)
+        heading = steps[index]
+        starts = np.flatnonzero((heading[1:] != heading[:-1]) & (heading[:-1] != 0))
+
+        done = []
+        for i, part in enumerate(np.split(rows, starts)):
+            if i > 0:
+                done.append(np.concatenate(self.pending))
+                self.pending = []
+            if len(part):
+                self.pending.append(part)
+        self.last_angle = angles[-1]
+        self.direction = heading[-1]
+        self.count += len(done)
+        return done
+
+    def current(self):
+        """Rows of the sweep in progress."""
+        if not self.pending:
+            return np.zeros((0, 0), dtype=np.int32)
+        return np.concatenate(self.pending)
+
+    def reset(self):
+        self.__init__()
+
+
+def iter_sweeps(batches):
+    """Regroups (rows, timestamps) batches into one array per sweep."""
+    splitter = SweepSplitter()
+    for rows, _ in batches:
+        yield from splitter.feed(rows)
+    rest = splitter.current()
+    if len(rest):
+        yield rest
+
+
+def export_recording(path, out_dir, mode="dots", fmt="png", last_only=False, size=CANVAS_SIZE,
+                     grid=True, persistence="replace", prefix="sweep"):
+    """
+    Renders a recording or CSV capture, one image per sweep (or only the final
+    state with last_only) and returns the written paths. Angles not covered by
+    a sweep keep their previous lines, as on screen.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown image format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    renderer = SweepImageRenderer(size, mode, grid)
+    sweeps = SweepBuffer(mode=persistence)
+    image = np.empty(renderer.shape, dtype=np.uint8)
+    written = []
+
+    def write(name):
+        target = os.path.join(out_dir, f"{name}.{fmt}")
+        save_image(renderer.render(sweeps, out=image), target, fmt)
+        written.append(target)
+
+    count = 0
+    for count, rows in enumerate(iter_sweeps(iter_source(path)), 1):
+        sweeps.add_frames(rows)
+        if not last_only:
+            write(f"{prefix}_{count:05d}")
+    if last_only and count:
+        write(prefix)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render sweeps to images without a display.")
+    parser.add_argument("source", help="sweep recording or CSV capture")
+    parser.add_argument("-o", "--output", default=".", help="output directory")
+    parser.add_argument("--mode", choices=("dots", "bmode"), default="dots",
+                        help="dots like the viewers, or interpolated B-mode image")
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("--last", action="store_true", help="write only the final image")
+    parser.add_argument("--persistence", choices=("replace", "last_k"), default="replace")
+    parser.add_argument("--size", default="1920x1024", help="canvas WIDTHxHEIGHT")
+    parser.add_argument("--no-grid", action="store_true", help="echoes on black only")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    written = export_recording(args.source, args.output, args.mode, args.format, args.last,
+                               (width, height), not args.no_grid, args.persistence)
+    print(f"Wrote {len(written)} image(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Compact binary sweep frames, and a decoder that also accepts the CSV lines.
+
+Frame layout (87 bytes, little endian), sent when the firmware is built with
+BINARY_FRAMES:
+
+    0xA5 0x5A | seq (u8) | angle (i16) | 80 echoes (u8) | CRC16 (u16)
+
+The CRC is CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over seq, angle and
+echoes, i.e. binascii.crc_hqx(body, 0xFFFF).
+"""
+import binascii
+
+import numpy as np
+
+from .parsing import N_ECHOES, N_FIELDS, SweepLineParser
+
+SYNC = b'\xa5\x5a'
+CRC_INIT = 0xFFFF
+
+FRAME_DTYPE = np.dtype([
+    ('sync', '<u2'),
+    ('seq', 'u1'),
+    ('angle', '<i2'),
+    ('echoes', 'u1', (N_ECHOES,)),
+    ('crc', '<u2'),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+_BODY = slice(2, FRAME_SIZE - 2)
+
+
+def crc16(data):
+    return binascii.crc_hqx(data, CRC_INIT)
+
+
+def encode_frame(seq, angle, echoes):
+    """Builds one binary frame; echoes are clipped to 0..255 like the firmware does."""
+    frame = np.zeros(1, dtype=FRAME_DTYPE)
+    frame['sync'] = np.frombuffer(SYNC, dtype='<u2')[0]
+    frame['seq'] = seq & 0xFF
+    frame['angle'] = angle
+    frame['echoes'] = np.clip(echoes, 0, 255)
+    raw = frame.tobytes()
+    frame['crc'] = crc16(raw[_BODY])
+    return frame.tobytes()
+
+
+def frames_to_rows(frames):
+    """Converts a FRAME_DTYPE array to the (n, 81) angle + echoes layout used everywhere else."""
+    rows = np.empty((len(frames), N_FIELDS), dtype=np.int32)
+    rows[:, 0] = frames['angle']
+    rows[:, 1:] = frames['echoes']
+    return rows
+
+
+class BinaryFrameDecoder:
+    """
+    Incremental decoder for binary frames. Bytes that don't belong to a frame
+    with a valid CRC are skipped, so a corrupted frame costs only itself.
+    """
+
+    def __init__(self):
+        self.pending = bytearray()
+        self.skipped = 0  # bytes dropped while looking for a valid frame
+        self.lost = 0     # frames missing according to the sequence numbers
+        self._last_seq = None
+
+    def feed_frames(self, chunk):
+        """Returns the new frames as a FRAME_DTYPE array."""
+        self.pending += chunk
+        buf = bytes(self.pending)
+        mv = memoryview(buf)
+
+        starts = []
+        pos = buf.find(SYNC)
+        while pos >= 0 and pos + FRAME_SIZE <= len(buf):
+            end = pos + FRAME_SIZE
+            if crc16(mv[pos + 2:end - 2]) == int.from_bytes(mv[end - 2:end], 'little'):
+                starts.append(pos)
+                pos = buf.find(SYNC, end)
+            else:
+                # Corrupted or false sync: resync on the next marker
+                pos = buf.find(SYNC, pos + 1)
+
+        # Keep what may still become a frame; drop everything before it
+        if pos < 0:
+            keep = len(buf) - 1 if buf.endswith(SYNC[:1]) else len(buf)
+        else:
+            keep = pos
+        del self.pending[:keep]
+        self.skipped += keep - len(starts) * FRAME_SIZE
+
+        if not starts:
+            return np.zeros(0, dtype=FRAME_DTYPE)
+        first = starts[0]
+        if starts[-1] - first == (len(starts) - 1) * FRAME_SIZE:
+            # Back to back frames (the usual case): view the buffer directly
+            frames = np.frombuffer(buf, dtype=FRAME_DTYPE, count=len(starts), offset=first)
+        else:
+            raw = np.frombuffer(buf, dtype=np.uint8)
+            idx = np.asarray(starts)[:, None] + np.arange(FRAME_SIZE)
+            frames = raw[idx].view(FRAME_DTYPE).reshape(-1)
+        self._count_lost(frames['seq'])
+        return frames
+
+    def feed(self, chunk):
+        """Same interface as SweepLineParser.feed: (rows, malformed)."""
+        rows = frames_to_rows(self.feed_frames(chunk))
+        return rows, np.zeros(len(rows), dtype=bool)
+
+    def _count_lost(self, seq):
+        if self._last_seq is not None:
+            seq = np.concatenate(([self._last_seq], seq))
+        else:
+            seq = np.asarray(seq)
+        gaps = (np.diff(seq.astype(np.int16)) - 1) % 256
+        self.lost += int(gaps.sum())
+        self._last_seq = int(seq[-1])
+
+    def reset(self):
+        self.pending.clear()
+        self._last_seq = None
+
+
+class SweepDecoder:
+    """
+    Detects whether the firmware sends CSV lines or binary frames from the
+    first bytes received, then delegates to the matching decoder. Older
+    firmware that only prints CSV keeps working unchanged.
+    """
+
+    MAX_PROBE = 4096
+
+    def __init__(self):
+        self.decoder = None
+        self._probe = bytearray()
+
+    @property
+    def mode(self):
+        if isinstance(self.decoder, BinaryFrameDecoder):
+            return "binary"
+        if isinstance(self.decoder, SweepLineParser):
+            return "csv"
+        return None
+
+    def feed(self, chunk):
+        if self.decoder is None:
+            self._probe += chunk
+            self.decoder = self._detect(bytes(self._probe))
+            if self.decoder is None:
+                return SweepLineParser().feed(b'')
+            chunk = bytes(self._probe)
+            self._probe.clear()
+        return self.decoder.feed(chunk)
+
+    def _detect(self, probe):
+        pos = probe.find(SYNC)
+        while 0 <= pos and pos + FRAME_SIZE <= len(probe):
+            end = pos + FRAME_SIZE
+            if crc16(probe[pos + 2:end - 2]) == int.from_bytes(probe[end - 2:end], 'little'):
+                return BinaryFrameDecoder()
+            pos = probe.find(SYNC, pos + 1)
+
+        # A complete printable line with all 81 fields means CSV
+        for line in probe.split(b'\n')[1:-1]:
+            if line.count(b',') == N_FIELDS - 1 and all(32 <= b < 127 or b == 13 for b in line):
+                return SweepLineParser()
+
+        if len(probe) > self.MAX_PROBE:
+            # Neither format seen yet, keep looking in fresh data
+            del self._probe[:len(probe) - FRAME_SIZE]
+        return None
+
+    def reset(self):
+        self.decoder = None
+        self._probe.clear()
@@ -0,0 +1,141 @@
+"""
+Precomputed polar-to-Cartesian tables for the radar sector.
+
+Angles are whole degrees in [-angle_bounds, angle_bounds] and bin n sits at
+n * bin_spacing from the origin, so every position the viewers can draw is
+known in advance. PolarGeometry computes them once per configuration and
+get_geometry() caches the result; drawing an A-line is then a table lookup
+instead of radians/sin/cos per sample.
+"""
+import functools
+import math
+
+import numpy as np
+
+from .parsing import N_ECHOES
+
+ANGLE_BOUNDS = 80
+BIN_SPACING = 12.5
+DOT_SIZE = 8
+
+
+def _disk_offsets(size):
+    """Pixel offsets covered by a dot of the given diameter centred on a pixel corner."""
+    r = size / 2
+    dy, dx = np.mgrid[-int(r):int(math.ceil(r)), -int(r):int(math.ceil(r))]
+    inside = (dx + 0.5) ** 2 + (dy + 0.5) ** 2 <= r * r
+    return dy[inside], dx[inside]
+
+
+class PolarGeometry:
+    """
+    Tables are indexed [angle + angle_bounds, bin]:
+
+    x, y            scene coordinates of the bin centre
+    px, py          the same in canvas pixels (canvas top left is `origin`)
+    dot_index       flat canvas indices covered by the dot of each bin, -1 when off canvas
+    dot_rect        (x0, y0, x1, y1) canvas rectangle of each dot
+
+B-mode reconstruction maps the other way (output pixel -> bins), see InverseMap.
+    """
+
+    def __init__(self, center, angle_bounds=ANGLE_BOUNDS, n_bins=N_ECHOES,
+                 bin_spacing=BIN_SPACING, dot_size=DOT_SIZE):
+        self.center = center
+        self.angle_bounds = angle_bounds
+        self.n_bins = n_bins
+        self.bin_spacing = bin_spacing
+        self.dot_size = dot_size
+
+        # The canvas only covers what the sector can reach
+        cx, cy = center
+        reach = (n_bins - 1) * bin_spacing + dot_size / 2
+        self.origin = (int(math.floor(cx - reach)), int(math.floor(cy - reach)))
+        width = int(math.ceil(cx + reach)) - self.origin[0] + 1
+        height = int(math.ceil(cy + dot_size / 2)) - self.origin[1] + 1
+        self.shape = (height, width)
+
+        self.angles = np.arange(-angle_bounds, angle_bounds + 1)
+        radians = np.radians(self.angles)[:, None]
+        ranges = (np.arange(n_bins) * bin_spacing)[None, :]
+        self.x = cx + ranges * np.sin(radians)
+        self.y = cy - ranges * np.cos(radians)
+        self.px = self.x - self.origin[0]
+        self.py = self.y - self.origin[1]
+
+        self._build_dots()
+
+    def _build_dots(self):
+        height, width = self.shape
+        dot_dy, dot_dx = _disk_offsets(self.dot_size)
+        ix = np.floor(self.px).astype(np.intp)
+        iy = np.floor(self.py).astype(np.intp)
+        xs = ix[..., None] + dot_dx
+        ys = iy[..., None] + dot_dy
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        self.dot_index = np.where(inside, ys * width + xs, -1)
+        self.dot_rect = np.stack([
+            np.clip(ix + dot_dx.min(), 0, width), np.clip(iy + dot_dy.min(), 0, height),
+            np.clip(ix + dot_dx.max() + 1, 0, width), np.clip(iy + dot_dy.max() + 1, 0, height),
+        ], axis=-1)
+
+    def angle_index(self, angle):
+        """Row of the tables for an angle, or None if it is outside the sector."""
+        i = int(angle) + self.angle_bounds
+        if 0 <= i < len(self.angles):
+            return i
+        return None
+
+
+@functools.lru_cache(maxsize=8)
+def get_geometry(center, angle_bounds=ANGLE_BOUNDS, n_bins=N_ECHOES,
+                 bin_spacing=BIN_SPACING, dot_size=DOT_SIZE):
+    """Cached PolarGeometry; a new one is only built when the view geometry changes."""
+    return PolarGeometry(tuple(center), angle_bounds, n_bins, bin_spacing, dot_size)
+
+
+class InverseMap:
+    """
+    Output-pixel -> (angle, bin) tables for bilinear reconstruction of a
+    continuous sector image. `scale` is output pixels per scene unit and
+    `center` the radar origin in output pixels.
+
+    pixels   flat output indices of the pixels inside the sector
+    index    (4, n) flat indices into an (angles x bins) array: the two
+             neighbouring angles times the two neighbouring bins
+    weight   (4, n) matching bilinear weights (float32)
+    """
+
+    def __init__(self, shape, center, scale=1.0, angle_bounds=ANGLE_BOUNDS,
+                 n_bins=N_ECHOES, bin_spacing=BIN_SPACING):
+        self.shape = shape
+        self.center = center
+        self.scale = scale
+        height, width = shape
+        n_angles = 2 * angle_bounds + 1
+
+        ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+        dx = (xs + 0.5 - center[0]) / scale
+        dy = (center[1] - ys - 0.5) / scale
+        r = np.hypot(dx, dy)
+        theta = np.degrees(np.arctan2(dx, dy))
+        inside = (np.abs(theta) <= angle_bounds) & (r <= (n_bins - 1) * bin_spacing)
+        self.pixels = np.flatnonzero(inside).astype(np.intp)
+
+        fa = theta.ravel()[self.pixels] + angle_bounds
+        fb = r.ravel()[self.pixels] / bin_spacing
+        a0 = np.clip(np.floor(fa), 0, n_angles - 2).astype(np.intp)
+        b0 = np.clip(np.floor(fb), 0, n_bins - 2).astype(np.intp)
+        wa = (fa - a0).astype(np.float32)
+        wb = (fb - b0).astype(np.float32)
+
+        i00 = (a0 * n_bins + b0).astype(np.int32)  # int32 halves the table size for full HD outputs
+        self.index = np.stack([i00, i00 + 1, i00 + n_bins, i00 + n_bins + 1])
+        self.weight = np.stack([(1 - wa) * (1 - wb), (1 - wa) * wb, wa * (1 - wb), wa * wb])
+
+
+@functools.lru_cache(maxsize=4)
+def get_inverse_map(shape, center, scale=1.0, angle_bounds=ANGLE_BOUNDS,
+                    n_bins=N_ECHOES, bin_spacing=BIN_SPACING):
+    """Cached InverseMap, rebuilt only when the output geometry changes."""
+    return InverseMap(tuple(shape), tuple(center), scale, angle_bounds, n_bins, bin_spacing)
@@ -0,0 +1,102 @@
+"""
+Background image encoding and writing.
+
+The caller renders whatever it wants to save into a QImage on the GUI thread
+(cheap), and ImageWriter encodes and writes it on a QThreadPool (the slow
+part for a large PNG). Saves to a path that is already being written are
+coalesced: only the most recent image is written next, once, and every
+callback that asked for that path is called. Callbacks run on the GUI
+thread with (path, ok).
+"""
+import os
+
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+def png_quality(compression):
+    """Maps a zlib-like level (0 fastest .. 9 smallest) to QImage.save's PNG quality."""
+    compression = min(max(int(compression), 0), 9)
+    return (9 - compression) * 100 // 9
+
+
+class _SaveJob(QRunnable):
+    def __init__(self, writer, image, path, quality):
+        super().__init__()
+        self.writer = writer
+        self.image = image
+        self.path = path
+        self.quality = quality
+
+    def run(self):
+        fmt = os.path.splitext(self.path)[1].lstrip(".").upper() or "PNG"
+        # Written aside and renamed: a reader never sees half an image
+        temporary = self.path + ".part"
+        ok = self.image.save(temporary, fmt, self.quality)
+        try:
+            if ok:
+                os.replace(temporary, self.path)
+            elif os.path.exists(temporary):
+                os.remove(temporary)
+        except OSError:
+            ok = False
+        self.writer._done.emit(self.path, ok)
+
+
+class ImageWriter(QObject):
+    saved = pyqtSignal(str, bool)  # path, ok; after the callbacks of that save
+    _done = pyqtSignal(str, bool)
+
+    def __init__(self, compression=1, max_threads=2, parent=None):
+        super().__init__(parent)
+        self.compression = compression
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._running = {}  # path -> callbacks of the save being written
+        self._queued = {}   # path -> (image, callbacks) waiting for that write to finish
+        self._done.connect(self._finish)  # queued: always handled on this object's thread
+
+    def quality_for(self, path):
+        if path.lower().endswith(".png"):
+            return png_quality(self.compression)
+        return -1  # format default (e.g. JPEG quality 75)
+
+    def save(self, image, path, callback=None):
+        """
+        Writes a QImage to `path` in the background. The image is shared
+        copy-on-write, so the caller may keep painting on its own copy.
+        """
+        callbacks = [callback] if callback is not None else []
+        if path in self._running:
+            if path in self._queued:
+                callbacks = self._queued[path][1] + callbacks
+            self._queued[path] = (image, callbacks)  # an older queued image is never written
+            return
+        self._start(image, path, callbacks)
+
+    def _start(self, image, path, callbacks):
+        self._running[path] = callbacks
+        self.pool.start(_SaveJob(self, image, path, self.quality_for(path)))
+
+    def _finish(self, path, ok):
+        callbacks = self._running.pop(path, [])
+        if path in self._queued:
+            image, queued_callbacks = self._queued.pop(path)
+            self._start(image, path, queued_callbacks)
+        for callback in callbacks:
+            callback(path, ok)
+        self.saved.emit(path, ok)
+
+    def is_writing(self, path):
+        return path in self._running or path in self._queued
+
+    def pending(self):
+        return len(self._running) + len(self._queued)
+
+    def wait_for_done(self, msecs=-1):
+        """Blocks until every queued save is on disk (e.g. before quitting)."""
+        while self._running:
+            if not self.pool.waitForDone(msecs):
+                return False
+            # Deliver the completions, which may start queued saves
+            QCoreApplication.processEvents()
+        return True
@@ -0,0 +1,189 @@
+"""
+Columnar store for the analyzer's measurements.
+
+One structured NumPy array holds every measurement (id, name, end points in
+scene coordinates, length in mm, wall clock timestamp, source image id); it
+doubles in place when full, so appending is amortized O(1) and a session of
+thousands of measurements over many images is filtered and summarized with
+array operations instead of Python loops over dicts. Lengths are float64
+numbers, formatted only when shown. Every column is fixed width (names are
+truncated to NAME_LENGTH characters), so tables save and memory-map without
+pickling.
+
+Removing a measurement (delete, undo of an add) only clears its `active`
+flag, so restoring it puts it back at its row, in creation order:
+
+    store.append(7, "Cyst", (10, 20), (40, 60), 38.4, image_id=2)
+    short = store.select(image_id=2, max_length=50.0)
+    store.stats(short)["mean"]
+    store.write_csv("measurements.csv")
+"""
+import csv
+import time
+
+import numpy as np
+
+NAME_LENGTH = 64
+
+MEASUREMENT_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('name', f'<U{NAME_LENGTH}'),
+    ('x0', '<f8'),
+    ('y0', '<f8'),
+    ('x1', '<f8'),
+    ('y1', '<f8'),
+    ('length_mm', '<f8'),
+    ('timestamp', '<f8'),   # time.time() when first added
+    ('image_id', '<i8'),
+])
+FIELDS = MEASUREMENT_DTYPE.names
+
+
+class MeasurementStore:
+    def __init__(self, capacity=256):
+        self._rows = np.zeros(capacity, dtype=MEASUREMENT_DTYPE)
+        self._active = np.zeros(capacity, dtype=bool)
+        self.count = 0          # rows used, active or not
+        self._index = {}        # id -> row
+
+    def __len__(self):
+        return int(self._active[:self.count].sum())
+
+    def __contains__(self, measurement_id):
+        row = self._index.get(measurement_id)
+        return row is not None and bool(self._active[row])
+
+    def append(self, measurement_id, name, start, end, length_mm, image_id=0, timestamp=None):
+        if measurement_id in self._index:
+            raise KeyError(f"Measurement {measurement_id} already stored")
+        if self.count == len(self._rows):
+            self._resize(2 * len(self._rows))
+        row = self.count
+        self._rows[row] = (measurement_id, name, start[0], start[1], end[0], end[1], length_mm,
+                           time.time() if timestamp is None else timestamp, image_id)
+        self._active[row] = True
+        self._index[measurement_id] = row
+        self.count += 1
+        return row
+
+    def _resize(self, capacity):
+        rows = np.zeros(capacity, dtype=MEASUREMENT_DTYPE)
+        rows[:self.count] = self._rows[:self.count]
+        active = np.zeros(capacity, dtype=bool)
+        active[:self.count] = self._active[:self.count]
+        self._rows, self._active = rows, active
+
+    def remove(self, measurement_id):
+        self._active[self._index[measurement_id]] = False
+
+    def restore(self, measurement_id):
+        """Brings back a removed measurement (undo); returns False if it was never stored."""
+        row = self._index.get(measurement_id)
+        if row is None:
+            return False
+        self._active[row] = True
+        return True
+
+    def clear(self):
+        self._active[:self.count] = False
+
+    def get(self, measurement_id):
+        """The measurement as a dict of plain Python values, or None."""
+        if measurement_id not in self:
+            return None
+        row = self._rows[self._index[measurement_id]]
+        return {field: row[field].item() for field in FIELDS}
+
+    def set_name(self, measurement_id, name):
+        self._rows['name'][self._index[measurement_id]] = name
+
+    def select(self, image_id=None, name=None, min_length=None, max_length=None,
+               since=None, until=None):
+        """Boolean mask over the active rows matching every condition given."""
+        rows = self.table()
+        mask = np.ones(len(rows), dtype=bool)
+        if image_id is not None:
+            mask &= np.isin(rows['image_id'], image_id)
+        if name is not None:
+            mask &= rows['name'] == name
+        if min_length is not None:
+            mask &= rows['length_mm'] >= min_length
+        if max_length is not None:
+            mask &= rows['length_mm'] <= max_length
+        if since is not None:
+            mask &= rows['timestamp'] >= since
+        if until is not None:
+            mask &= rows['timestamp'] <= until
+        return mask
+
+    def table(self, mask=None):
+        """Active measurements in creation order (a copy), optionally filtered by a select() mask."""
+        rows = self._rows[:self.count][self._active[:self.count]]
+        return rows if mask is None else rows[mask]
+
+    def stats(self, mask=None):
+        lengths = self.table(mask)['length_mm']
+        if len(lengths) == 0:
+            return {"count": 0}
+        return {
+            "count": len(lengths),
+            "mean": float(lengths.mean()),
+            "std": float(lengths.std()),
+            "min": float(lengths.min()),
+            "median": float(np.median(lengths)),
+            "max": float(lengths.max()),
+        }
+
+    def stats_per_image(self, mask=None):
+        """image id -> (count, mean length), one bincount pass."""
+        rows = self.table(mask)
+        images, index = np.unique(rows['image_id'], return_inverse=True)
+        counts = np.bincount(index, minlength=len(images))
+        sums = np.bincount(index, weights=rows['length_mm'], minlength=len(images))
+        return {int(i): (int(c), float(s / c)) for i, c, s in zip(images, counts, sums)}
+
+    def write_csv(self, path, mask=None, chunk=4096):
+        """
+        Writes the measurements chunk by chunk; floats are written with
+        repr(), so reading the file back gives the exact same numbers.
+        """
+        rows = self.table(mask)
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(FIELDS)
+            for start in range(0, len(rows), chunk):
+                part = rows[start:start + chunk]
+                writer.writerows(zip(*(part[field].tolist() for field in FIELDS)))
+
+    def write_npz(self, path, mask=None, compress=False, image_names=None):
+        """
+        One array per column, loadable without pickle; `image_names` (image
+        id -> name) is saved along, see read_image_names().
+        """
+        rows = self.table(mask)
+        columns = {field: rows[field] for field in FIELDS}
+        if image_names:
+            columns['image_table_id'] = np.array(list(image_names), dtype='<i8')
+            columns['image_table_name'] = np.array([str(n) for n in image_names.values()])
+        (np.savez_compressed if compress else np.savez)(path, **columns)
+
+    @classmethod
+    def read_npz(cls, path):
+        store = cls()
+        with np.load(path) as data:
+            n = len(data['id'])
+            store._resize(max(n, 1))
+            for field in FIELDS:
+                store._rows[field][:n] = data[field]
+            store._active[:n] = True
+            store.count = n
+            store._index = {int(i): row for row, i in enumerate(data['id'])}
+        return store
+
+
+def read_image_names(path):
+    """Image id -> name saved by write_npz, empty for exports without them."""
+    with np.load(path) as data:
+        if 'image_table_id' not in data:
+            return {}
+        return dict(zip(data['image_table_id'].tolist(), data['image_table_name'].tolist()))
@@ -0,0 +1,124 @@
+"""
+Vectorized parser for the "angle,e0,...,e79" lines printed by the firmware.
+
+Instead of splitting and converting each line in Python (81 int() calls per
+line), a whole chunk of bytes is parsed at once with NumPy: separators are
+located and the digits of every field are summed by place value.
+"""
+import numpy as np
+
+N_ECHOES = 80
+N_FIELDS = N_ECHOES + 1
+
+_COMMA = ord(',')
+_NEWLINE = ord('\n')
+_MINUS = ord('-')
+_ZERO = ord('0')
+_NINE = ord('9')
+_CR = ord('\r')
+_SPACE = ord(' ')
+_MAX_DIGITS = 9  # larger numbers can't come from the firmware, treat them as garbage
+
+
+def parse_sweep_lines(block, n_fields=N_FIELDS):
+    """
+    Parses a block of complete lines (every line terminated by a newline).
+
+    Returns (frames, malformed): frames is an (n_lines, n_fields) int32 array
+    holding the angle in column 0 and the echoes after it, malformed is a
+    boolean mask of the rows that did not have the expected layout (those rows
+    are left at zero). Blank lines are skipped. As before, echo values that
+    are not plain numbers are read as 0.
+    """
+    empty = np.zeros((0, n_fields), dtype=np.int32), np.zeros(0, dtype=bool)
+    buf = np.frombuffer(block, dtype=np.uint8)
+    if buf.size == 0:
+        return empty
+    if buf[-1] != _NEWLINE:
+        raise ValueError("block must end with a newline")
+
+    ignored = (buf == _CR) | (buf == _SPACE)
+    if ignored.any():
+        buf = buf[~ignored]
+
+    is_newline = buf == _NEWLINE
+    is_sep = is_newline | (buf == _COMMA)
+    is_digit = (buf >= _ZERO) & (buf <= _NINE)
+
+    # Fields are delimited by separators; everything below works per field
+    sep_pos = np.flatnonzero(is_sep)
+    field_start = np.empty_like(sep_pos)
+    field_start[0] = 0
+    field_start[1:] = sep_pos[:-1] + 1
+
+    # Non-digit bytes are rare, so locate them instead of counting per byte.
+    # A minus sign is only valid as the first character of a field.
+    odd_pos = np.flatnonzero(~(is_digit | is_sep))
+    odd_field = np.searchsorted(sep_pos, odd_pos)
+    leading_minus = (buf[odd_pos] == _MINUS) & (odd_pos == field_start[odd_field])
+    negative = np.zeros(sep_pos.size, dtype=bool)
+    negative[odd_field[leading_minus]] = True
+    field_bad = np.zeros(sep_pos.size, dtype=bool)
+    field_bad[odd_field[~leading_minus]] = True
+
+    n_digits = sep_pos - field_start - negative
+    field_bad |= (n_digits == 0) | (n_digits > _MAX_DIGITS)
+
+    # Accumulate digits from the right, one place value at a time
+    values = np.zeros(sep_pos.size, dtype=np.int64)
+    longest = n_digits[~field_bad].max(initial=0)
+    for k in range(longest):
+        has_digit = n_digits > k
+        digit = buf[np.where(has_digit, sep_pos - 1 - k, 0)].astype(np.int64) - _ZERO
+        values += np.where(has_digit, digit, 0) * 10 ** k
+    values[negative] *= -1
+    values[field_bad] = 0
+
+    # Group the fields back into lines
+    line_end_field = np.flatnonzero(is_newline[sep_pos])
+    line_first_field = np.concatenate(([0], line_end_field[:-1] + 1))
+    fields_per_line = line_end_field - line_first_field + 1
+
+    # Lines with a single empty field are blank lines
+    first = line_first_field
+    blank = (fields_per_line == 1) & (sep_pos[first] == field_start[first])
+    line_first_field = line_first_field[~blank]
+    fields_per_line = fields_per_line[~blank]
+    n_lines = line_first_field.size
+    if n_lines == 0:
+        return empty
+
+    malformed = fields_per_line != n_fields
+    malformed[~malformed] = field_bad[line_first_field[~malformed]]  # angle must be a number
+    good = line_first_field[~malformed]
+    idx = good[:, None] + np.arange(n_fields)
+    rows = values[idx]
+    # Echoes are unsigned; a negative echo is garbage like any other
+    rows[:, 1:][negative[idx][:, 1:]] = 0
+
+    frames = np.zeros((n_lines, n_fields), dtype=np.int32)
+    frames[~malformed] = rows
+    return frames, malformed
+
+
+class SweepLineParser:
+    """
+    Incremental parser fed with raw byte chunks as they come from the port.
+    A partial trailing line is kept until the chunk that completes it arrives.
+    """
+
+    def __init__(self, n_fields=N_FIELDS):
+        self.n_fields = n_fields
+        self.pending = bytearray()
+
+    def feed(self, chunk):
+        self.pending += chunk
+        end = self.pending.rfind(b'\n')
+        if end < 0:
+            return parse_sweep_lines(b'', self.n_fields)
+        block = bytes(self.pending[:end + 1])
+        del self.pending[:end + 1]
+        return parse_sweep_lines(block, self.n_fields)
+
+    def reset(self):
+        self.pending.clear()
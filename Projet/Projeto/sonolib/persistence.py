@@ -0,0 +1,102 @@
+"""
+Fixed-size per-angle echo store with configurable persistence.
+
+The store is one (angles x bins) array, so memory and render cost depend on
+the sector geometry only, never on how long the acquisition runs. Modes:
+
+    replace  a new line at an angle replaces the previous one
+    decay    phosphor-like: everything fades with time constant decay_time
+             and new echoes are drawn on top of what is left
+    last_k   each angle shows the maximum of its last `keep` lines
+"""
+import time
+
+import numpy as np
+
+from .geometry import ANGLE_BOUNDS
+from .parsing import N_ECHOES
+
+MODES = ("replace", "decay", "last_k")
+
+
+class SweepBuffer:
+    def __init__(self, angle_bounds=ANGLE_BOUNDS, n_bins=N_ECHOES, mode="replace",
+                 decay_time=2.0, keep=4):
+        if mode not in MODES:
+            raise ValueError(f"Unknown persistence mode: {mode}")
+        self.angle_bounds = angle_bounds
+        self.n_bins = n_bins
+        self.mode = mode
+        self.decay_time = decay_time
+        self.keep = keep
+
+        n_angles = 2 * angle_bounds + 1
+        self.data = np.zeros((n_angles, n_bins), dtype=np.float32)  # what is displayed
+        self.dirty = np.zeros(n_angles, dtype=bool)
+        self.seen = np.zeros(n_angles, dtype=bool)  # angles that received at least one line
+        self.last_angle = None
+        if mode == "last_k":
+            self.history = np.zeros((keep, n_angles, n_bins), dtype=np.float32)
+            self.slot = np.zeros(n_angles, dtype=np.intp)
+        self._last_fade = time.monotonic()
+
+    @property
+    def angles(self):
+        return np.arange(-self.angle_bounds, self.angle_bounds + 1)
+
+    def clear(self):
+        self.data.fill(0)
+        self.dirty.fill(True)
+        self.seen.fill(False)
+        if self.mode == "last_k":
+            self.history.fill(0)
+            self.slot.fill(0)
+
+    def add_frames(self, frames):
+        """Stores (n, 81) angle + echoes rows; angles outside the sector are dropped."""
+        frames = np.asarray(frames)
+        if len(frames) == 0:
+            return
+        rows = frames[:, 0].astype(np.intp) + self.angle_bounds
+        valid = (rows >= 0) & (rows < len(self.data))
+        rows = rows[valid]
+        echoes = frames[valid, 1:self.n_bins + 1].astype(np.float32)
+        if len(rows) == 0:
+            return
+        self.last_angle = int(rows[-1]) - self.angle_bounds
+
+        if self.mode == "replace":
+            # Only the last line of each angle in the batch matters
+            last = len(rows) - 1 - np.unique(rows[::-1], return_index=True)[1]
+            self.data[rows[last]] = echoes[last]
+        elif self.mode == "decay":
+            np.maximum.at(self.data, rows, echoes)
+        else:
+            for row, line in zip(rows.tolist(), echoes):
+                self.history[self.slot[row], row] = line
+                self.slot[row] = (self.slot[row] + 1) % self.keep
+            touched = np.unique(rows)
+            self.data[touched] = self.history[:, touched].max(axis=0)
+        self.dirty[rows] = True
+        self.seen[rows] = True
+
+    def fade(self, now=None):
+        """Applies the decay since the last call (decay mode only)."""
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self._last_fade
+        self._last_fade = now
+        if self.mode != "decay" or elapsed <= 0:
+            return
+        lit = self.data.max(axis=1) >= 1
+        if not lit.any():
+            return
+        self.data[lit] *= np.float32(np.exp(-elapsed / self.decay_time))
+        self.data[self.data < 1] = 0  # below the first gray level it is black anyway
+        self.dirty |= lit
+
+    def take_dirty(self):
+        """Returns the indices of the angles changed since the last call and clears the flags."""
+        rows = np.flatnonzero(self.dirty)
+        self.dirty[rows] = False
+        return rows
@@ -0,0 +1,89 @@
+"""
+NumPy views of QImage pixels and QImages over NumPy arrays, without copies.
+
+    pixels = qimage_view(image)        # (h, w) or (h, w, c) uint8, shares image memory
+    image = array_to_qimage(array)     # QImage drawing straight from `array`
+
+Lifetime: a view keeps its QImage alive (and vice versa), so neither side
+can be freed while the other still points at the memory. Two things still
+copy, by Qt's design: QPixmap.fromImage (pixmaps live in the window system)
+and writing to a QImage that shares its data with another QImage (Qt
+detaches first, qimage_view does it up front).
+
+Channel order is the one in memory: ARGB32/RGB32 are B, G, R, A on
+little-endian machines.
+"""
+import numpy as np
+from PyQt5 import sip
+from PyQt5.QtGui import QImage
+
+CHANNELS = {
+    QImage.Format_Grayscale8: 1,
+    QImage.Format_Indexed8: 1,
+    QImage.Format_RGB888: 3,
+    QImage.Format_RGB32: 4,
+    QImage.Format_ARGB32: 4,
+    QImage.Format_ARGB32_Premultiplied: 4,
+    QImage.Format_RGBA8888: 4,
+}
+ARRAY_FORMATS = {1: QImage.Format_Grayscale8, 3: QImage.Format_RGB888, 4: QImage.Format_ARGB32}
+
+
+class _ImageMemory:
+    """Exposes QImage memory to NumPy and holds the QImage while arrays use it."""
+
+    def __init__(self, image, address, shape, strides, readonly=False):
+        self.image = image
+        self.__array_interface__ = {
+            "version": 3, "typestr": "|u1", "data": (address, readonly),
+            "shape": shape, "strides": strides,
+        }
+
+
+def qimage_view(image, writable=True):
+    """
+    Writable uint8 view of a QImage's pixels: (h, w) for 8-bit formats,
+    (h, w, channels) otherwise. Raises ValueError for formats without a
+    whole number of bytes per channel (convert the image first). With
+    writable=False the view is read-only and a shared image is not detached
+    (no copy), e.g. to hash or measure it.
+    """
+    channels = CHANNELS.get(image.format())
+    if channels is None:
+        raise ValueError(f"Unsupported QImage format: {image.format()}")
+    height, width = image.height(), image.width()
+    if writable:
+        address = int(image.bits())  # non-const access: detaches the image if it was shared
+    else:
+        address = int(image.constBits())
+    if channels == 1:
+        shape, strides = (height, width), (image.bytesPerLine(), 1)
+    else:
+        shape, strides = (height, width, channels), (image.bytesPerLine(), channels, 1)
+    return np.asarray(_ImageMemory(image, address, shape, strides, not writable))
+
+
+def array_to_qimage(array, fmt=None):
+    """
+    QImage over the memory of a uint8 array: (h, w) -> Grayscale8,
+    (h, w, 3) -> RGB888, (h, w, 4) -> ARGB32 (B, G, R, A bytes), unless
+    `fmt` says otherwise (e.g. Indexed8 with a color table). Rows may be
+    padded, but the pixels of a row must be contiguous. The image keeps
+    the array alive; changes on either side show on the other.
+    """
+    if array.dtype != np.uint8:
+        raise ValueError(f"Expected a uint8 array, got {array.dtype}")
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    if array.ndim not in (2, 3) or channels not in ARRAY_FORMATS:
+        raise ValueError(f"Unsupported array shape: {array.shape}")
+    if array.strides[1] != channels or (array.ndim == 3 and array.strides[2] != 1):
+        raise ValueError("The pixels of each row must be contiguous")
+    if not array.flags.writeable:
+        array = array.copy()  # Qt would copy a read-only buffer on the first write anyway
+    if fmt is None:
+        fmt = ARRAY_FORMATS[channels]
+    height, width = array.shape[:2]
+    # A writable pointer, otherwise Qt copies the buffer as soon as the image is modified
+    image = QImage(sip.voidptr(array.ctypes.data), width, height, array.strides[0], fmt)
+    image.array = array
+    return image
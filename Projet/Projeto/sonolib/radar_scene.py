@@ -0,0 +1,77 @@
+"""
+QGraphicsScene that draws the static radar grid as its background.
+
+The range rings, bearing lines and angle labels are painted in
+drawBackground() instead of being added as items, and the view caches the
+background (QGraphicsView.CacheBackground), so the grid is only repainted
+when the view is resized or zoomed. scene.render() still includes it, so
+captures keep the grid.
+"""
+import math
+
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QColor, QFont, QPen
+from PyQt5.QtWidgets import QGraphicsScene, QGraphicsView
+
+from .geometry import ANGLE_BOUNDS
+
+
+class RadarScene(QGraphicsScene):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setBackgroundBrush(Qt.black)
+        self.grid = None
+        self.grid_pen = QPen(Qt.gray)
+        self.grid_pen.setCosmetic(True)  # one pixel wide at any zoom
+        self.label_color = QColor(Qt.gray)
+        self.label_font = QFont("Arial", 10)
+
+    def set_grid(self, center, ring_radius, line_length, angle_bounds=ANGLE_BOUNDS,
+                 ring_step=100, bearing_step=20):
+        """Rings every ring_step up to ring_radius, bearing lines every bearing_step degrees."""
+        self.grid = (center, ring_radius, line_length, angle_bounds, ring_step, bearing_step)
+        self.invalidate(QRectF(), QGraphicsScene.BackgroundLayer)
+
+    def grid_rect(self):
+        """
+        Scene rect the grid is drawn in (rings above the centre, labels),
+        which sceneRect() does not cover once only the echo image is an item.
+        """
+        if self.grid is None:
+            return QRectF()
+        (cx, cy), ring_radius, line_length, angle_bounds, ring_step, bearing_step = self.grid
+        rect = QRectF(cx - ring_radius, cy - ring_radius, 2 * ring_radius, ring_radius)
+        for angle in range(-angle_bounds, angle_bounds + 1, bearing_step):
+            rad_angle = math.radians(angle)
+            x = cx + line_length * math.sin(rad_angle)
+            y = cy - line_length * math.cos(rad_angle)
+            rect = rect.united(QRectF(x - 30, y - 22, 60, 18))
+        return rect
+
+    def drawBackground(self, painter, rect):
+        super().drawBackground(painter, rect)
+        if self.grid is None:
+            return
+        (cx, cy), ring_radius, line_length, angle_bounds, ring_step, bearing_step = self.grid
+
+        painter.save()
+        painter.setPen(self.grid_pen)
+        for radius in range(ring_step, ring_radius + 1, ring_step):
+            painter.drawEllipse(QPointF(cx, cy), radius, radius)
+
+        painter.setFont(self.label_font)
+        for angle in range(-angle_bounds, angle_bounds + 1, bearing_step):
+            rad_angle = math.radians(angle)
+            x = cx + line_length * math.sin(rad_angle)
+            y = cy - line_length * math.cos(rad_angle)
+            painter.setPen(self.grid_pen)
+            painter.drawLine(QPointF(cx, cy), QPointF(x, y))
+            painter.setPen(self.label_color)
+            painter.drawText(QRectF(x - 30, y - 22, 60, 18), Qt.AlignCenter, f"{angle}°")
+        painter.restore()
+
+
+def setup_radar_view(view):
+    """Lets the view keep the rendered grid in a pixmap instead of repainting it."""
+    view.setCacheMode(QGraphicsView.CacheBackground)
+    view.resetCachedContent()
@@ -0,0 +1,41 @@
+"""
+QGraphicsItem that shows a ScanConverter buffer.
+
+The QImage wraps the NumPy buffer without copying, and paint() only draws the
+exposed part of it, so marking a dirty rectangle repaints just that area of
+the view instead of the whole sector. Level 0 is transparent so the grid
+drawn in the scene background shows through.
+"""
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QImage, qRgb, qRgba
+from PyQt5.QtWidgets import QGraphicsItem
+
+from .qimage_bridge import array_to_qimage
+
+
+GRAY_TABLE = [qRgba(0, 0, 0, 0)] + [qRgb(i, i, i) for i in range(1, 256)]
+
+
+class RasterItem(QGraphicsItem):
+    def __init__(self, converter, parent=None):
+        super().__init__(parent)
+        self.converter = converter  # keeps the buffer alive while the QImage points at it
+        self.image = array_to_qimage(converter.buffer, QImage.Format_Indexed8)
+        self.image.setColorTable(GRAY_TABLE)
+        self.setPos(*converter.origin)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setZValue(-1)  # behind the annotations
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.image.width(), self.image.height())
+
+    def paint(self, painter, option, widget=None):
+        rect = option.exposedRect
+        painter.drawImage(rect, self.image, rect)
+
+    def mark_dirty(self, rect):
+        """Schedules a repaint of (x0, y0, x1, y1) in buffer pixels."""
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        self.update(QRectF(x0, y0, x1 - x0, y1 - y0))
@@ -0,0 +1,89 @@
+"""
+Continuous B-mode sector image from an angle-indexed sweep buffer.
+
+Every output pixel is mapped back to a fractional (angle, bin) position once
+(geometry.get_inverse_map), so a frame is four gathers and a weighted sum
+over the whole image: bilinear across adjacent angles and adjacent bins.
+Small gaps of angles that never received a line (e.g. firmware stepping 2
+degrees) are filled from their neighbours first so they don't show up as
+dark rays.
+Only NumPy is needed, so this also runs headless.
+"""
+import numpy as np
+
+from .geometry import ANGLE_BOUNDS, BIN_SPACING, get_inverse_map
+from .parsing import N_ECHOES
+
+GAP_FILL = 4  # widest run of missing angles that is interpolated over
+
+
+def fill_missing_angles(data, seen, max_gap=GAP_FILL):
+    """
+    Linearly interpolates the rows of `data` whose `seen` flag is False when
+    they sit in a gap of at most `max_gap` rows between two seen rows. Rows
+    outside the scanned range or in larger gaps stay as they are.
+    """
+    seen_rows = np.flatnonzero(seen)
+    if len(seen_rows) < 2 or len(seen_rows) == len(data):
+        return data
+    missing = np.flatnonzero(~seen)
+    upper = np.searchsorted(seen_rows, missing)
+    interior = (upper > 0) & (upper < len(seen_rows))
+    missing, upper = missing[interior], upper[interior]
+    lo, hi = seen_rows[upper - 1], seen_rows[upper]
+    small = hi - lo <= max_gap
+    missing, lo, hi = missing[small], lo[small], hi[small]
+    if len(missing) == 0:
+        return data
+
+    w = ((missing - lo) / (hi - lo)).astype(data.dtype)[:, None]
+    filled = data.copy()
+    filled[missing] = data[lo] * (1 - w) + data[hi] * w
+    return filled
+
+
+class SectorReconstructor:
+    """
+    Renders (angles x bins) data into a (height, width) uint8 image. By
+    default the radar origin is at the bottom centre and the full range fits
+    the image, like the viewers' layout.
+    """
+
+    def __init__(self, shape=(1024, 1920), center=None, scale=None, angle_bounds=ANGLE_BOUNDS,
+                 n_bins=N_ECHOES, bin_spacing=BIN_SPACING):
+        height, width = shape
+        max_range = (n_bins - 1) * bin_spacing
+        if center is None:
+            center = (width / 2, height)
+        if scale is None:
+            scale = min(center[1], center[0], width - center[0]) / max_range
+        self.shape = (height, width)
+        self.angle_bounds = angle_bounds
+        self.n_bins = n_bins
+        self.map = get_inverse_map(self.shape, tuple(center), scale, angle_bounds, n_bins, bin_spacing)
+
+    def render(self, data, seen=None, out=None):
+        """
+        `data` is indexed [angle + angle_bounds, bin]; `seen` optionally marks
+        the angles that hold real lines. Pixels outside the sector are left
+        untouched in `out` (zero in a new image).
+        """
+        data = np.asarray(data, dtype=np.float32)
+        if seen is not None:
+            data = fill_missing_angles(data, seen)
+        flat = data.ravel()
+        m = self.map
+        values = flat[m.index[0]] * m.weight[0]
+        for k in range(1, 4):
+            values += flat[m.index[k]] * m.weight[k]
+        np.clip(values, 0, 255, out=values)
+
+        if out is None:
+            out = np.zeros(self.shape, dtype=np.uint8)
+        out.reshape(-1)[m.pixels] = values.astype(np.uint8)
+        return out
+
+
+def reconstruct(data, shape=(1024, 1920), seen=None, **kwargs):
+    """One-shot helper for offline use: sweep buffer in, sector image out."""
+    return SectorReconstructor(shape, **kwargs).render(data, seen)
@@ -0,0 +1,258 @@
+"""
+Append-only sweep recordings.
+
+A recording is a 64 byte header followed by fixed size records of
+(monotonic timestamp, angle, 80 echoes). Plain recordings are written through
+a memory map that grows in place, so an hour-long session never sits in the
+Python heap and SweepRecording can expose it as a NumPy view of the file.
+
+Compressed recordings store the records in zlib chunks instead. Each chunk
+carries its record count and first/last timestamps, so a time range can be
+read back by decompressing only the chunks that overlap it.
+"""
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from .parsing import N_ECHOES
+
+MAGIC = b'SWEEPREC'
+VERSION = 1
+FLAG_ZLIB = 1
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u2'),
+    ('flags', '<u2'),
+    ('n_echoes', '<u2'),
+    ('reserved0', '<u2'),
+    ('count', '<u8'),
+    ('reserved', 'u1', (40,)),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+# n_records, compressed size, first timestamp, last timestamp
+CHUNK_HEADER = struct.Struct('<IIdd')
+
+
+def record_dtype(n_echoes=N_ECHOES):
+    return np.dtype([
+        ('t', '<f8'),
+        ('angle', '<i2'),
+        ('echoes', '<u2', (n_echoes,)),
+    ])
+
+
+def records_to_rows(records):
+    """Converts records to the (n, 81) angle + echoes layout used by the viewers."""
+    n_echoes = records.dtype['echoes'].shape[0]
+    rows = np.empty((len(records), n_echoes + 1), dtype=np.int32)
+    rows[:, 0] = records['angle']
+    rows[:, 1:] = records['echoes']
+    return rows
+
+
+class SweepRecorder:
+    def __init__(self, path, n_echoes=N_ECHOES, compress=False, capacity=65536,
+                 chunk_records=4096, level=6):
+        self.path = path
+        self.dtype = record_dtype(n_echoes)
+        self.compress = compress
+        self.level = level
+        self.count = 0
+
+        self._file = open(path, 'w+b')
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['flags'] = FLAG_ZLIB if compress else 0
+        header['n_echoes'] = n_echoes
+        self._header = header
+        self._file.write(header.tobytes())
+
+        if compress:
+            self._chunk = np.zeros(chunk_records, dtype=self.dtype)
+            self._chunk_fill = 0
+            self._map = None
+        else:
+            self._chunk = None
+            self._map = None
+            self._resize(capacity)
+
+    def _resize(self, capacity):
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        self._file.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._map = np.memmap(self._file, dtype=self.dtype, mode='r+',
+                              offset=HEADER_SIZE, shape=(capacity,))
+
+    def append(self, rows, timestamps=None):
+        """
+        Appends (n, 81) angle + echoes rows. Without timestamps every row gets
+        the current time.monotonic(), i.e. the time the chunk was received.
+        """
+        rows = np.asarray(rows)
+        n = len(rows)
+        if n == 0:
+            return
+        if timestamps is None:
+            timestamps = time.monotonic()
+
+        if self.compress:
+            start = 0
+            while start < n:
+                take = min(n - start, len(self._chunk) - self._chunk_fill)
+                dest = self._chunk[self._chunk_fill:self._chunk_fill + take]
+                self._fill(dest, rows[start:start + take],
+                           timestamps if np.isscalar(timestamps) else timestamps[start:start + take])
+                self._chunk_fill += take
+                start += take
+                if self._chunk_fill == len(self._chunk):
+                    self._write_chunk()
+        else:
+            if self.count + n > len(self._map):
+                self._resize(max(2 * len(self._map), self.count + n))
+            self._fill(self._map[self.count:self.count + n], rows, timestamps)
+        self.count += n
+
+    @staticmethod
+    def _fill(dest, rows, timestamps):
+        dest['t'] = timestamps
+        dest['angle'] = rows[:, 0]
+        dest['echoes'] = np.clip(rows[:, 1:], 0, 0xFFFF)
+
+    def _write_chunk(self):
+        if self._chunk_fill == 0:
+            return
+        records = self._chunk[:self._chunk_fill]
+        data = zlib.compress(records.tobytes(), self.level)
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(CHUNK_HEADER.pack(len(records), len(data), records['t'][0], records['t'][-1]))
+        self._file.write(data)
+        self._chunk_fill = 0
+
+    def _write_count(self):
+        self._header['count'] = self.count
+        self._file.seek(0)
+        self._file.write(self._header.tobytes())
+
+    def flush(self):
+        """Makes everything appended so far readable by SweepRecording."""
+        if self.compress:
+            self._write_chunk()
+        else:
+            self._map.flush()
+        self._write_count()
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        if not self.compress:
+            self._map = None
+            self._file.truncate(HEADER_SIZE + self.count * self.dtype.itemsize)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SweepRecording:
+    """Read access to a recording without loading it into memory."""
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header['magic'][0] != MAGIC:
+            raise ValueError(f"{path} is not a sweep recording")
+        if header['version'][0] > VERSION:
+            raise ValueError(f"{path} uses an unsupported recording version {header['version'][0]}")
+        self.dtype = record_dtype(int(header['n_echoes'][0]))
+        self.compressed = bool(header['flags'][0] & FLAG_ZLIB)
+        self.count = int(header['count'][0])
+
+        if self.compressed:
+            self.records = None
+            self._load_chunk_index()
+        else:
+            self.records = np.memmap(path, dtype=self.dtype, mode='r',
+                                     offset=HEADER_SIZE, shape=(self.count,)) \
+                if self.count else np.zeros(0, dtype=self.dtype)
+
+    def _load_chunk_index(self):
+        offsets, starts, t_first, t_last = [], [], [], []
+        total = 0
+        with open(self.path, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            while total < self.count:
+                raw = f.read(CHUNK_HEADER.size)
+                if len(raw) < CHUNK_HEADER.size:
+                    break
+                n, size, first, last = CHUNK_HEADER.unpack(raw)
+                offsets.append((f.tell(), size))
+                starts.append(total)
+                t_first.append(first)
+                t_last.append(last)
+                total += n
+                f.seek(size, os.SEEK_CUR)
+        self._chunks = offsets
+        self._chunk_start = np.array(starts + [total], dtype=np.int64)
+        self._chunk_t_first = np.array(t_first)
+        self._chunk_t_last = np.array(t_last)
+        self.count = total
+
+    def __len__(self):
+        return self.count
+
+    def _read_chunk(self, i):
+        offset, size = self._chunks[i]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = zlib.decompress(f.read(size))
+        return np.frombuffer(data, dtype=self.dtype)
+
+    def __getitem__(self, index):
+        """Slices return a view for plain recordings and a decompressed copy otherwise."""
+        if not self.compressed:
+            return self.records[index]
+        if not isinstance(index, slice):
+            if index < 0:
+                index += self.count
+            return self[index:index + 1][0]
+        rows = range(*index.indices(self.count))
+        if not rows:
+            return np.zeros(0, dtype=self.dtype)
+        # Decompress the chunks between the lowest and highest row, whatever the direction
+        low, high = min(rows[0], rows[-1]), max(rows[0], rows[-1]) + 1
+        first = np.searchsorted(self._chunk_start, low, side='right') - 1
+        last = np.searchsorted(self._chunk_start, high, side='left')
+        parts = [self._read_chunk(i) for i in range(first, last)]
+        data = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        offset = self._chunk_start[first]
+        # Both ends are rows of the slice, so the step lands on every one of them
+        return data[low - offset:high - offset][::rows.step]
+
+    def time_range(self, t0, t1):
+        """Records with t0 <= t < t1; timestamps are monotonic so this is a binary search."""
+        if not self.compressed:
+            t = self.records['t']
+            return self.records[np.searchsorted(t, t0):np.searchsorted(t, t1)]
+        first = np.searchsorted(self._chunk_t_last, t0, side='left')
+        last = np.searchsorted(self._chunk_t_first, t1, side='left')
+        if first >= last:
+            return np.zeros(0, dtype=self.dtype)
+        data = self[self._chunk_start[first]:self._chunk_start[last]]
+        t = data['t']
+        return data[np.searchsorted(t, t0):np.searchsorted(t, t1)]
+
+    def iter_chunks(self, size=4096):
+        for start in range(0, self.count, size):
+            yield self[start:start + size]
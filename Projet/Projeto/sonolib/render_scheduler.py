@@ -0,0 +1,76 @@
+"""
+Paces the radar repaints independently of the acquisition rate.
+
+Frames go into the SweepBuffer as soon as they are received (cheap, no Qt
+work), and a timer running at the display rate turns whatever changed since
+the last tick into one scan conversion and one dirty-rectangle update. A
+burst of lines therefore costs one paint instead of one per line, a slow
+paint never holds up the serial thread, and ticks where nothing changed do
+no drawing at all.
+"""
+import time
+
+from PyQt5.QtCore import QObject, Qt, QTimer
+
+
+class RenderScheduler(QObject):
+    """
+    `item` is the RasterItem showing `scan`; assign a new one to `item` when
+    the viewer rebuilds it.
+    """
+
+    def __init__(self, sweeps, scan, item, rate=30.0, parent=None):
+        super().__init__(parent)
+        self.sweeps = sweeps
+        self.scan = scan
+        self.item = item
+        self.pending = 0  # frames stored since the last paint
+        self.paints = 0
+        self.skipped = 0
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.flush)
+        self.set_rate(rate)
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate):
+        """Maximum number of repaints per second."""
+        if rate <= 0:
+            raise ValueError("Display rate must be positive")
+        self._rate = float(rate)
+        self.timer.setInterval(max(1, int(round(1000 / self._rate))))
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    @property
+    def is_running(self):
+        return self.timer.isActive()
+
+    def add_frames(self, frames):
+        """Stores (n, 81) angle + echoes rows; they are drawn on the next tick."""
+        if len(frames):
+            self.sweeps.add_frames(frames)
+            self.pending += len(frames)
+
+    def flush(self, now=None):
+        """
+        Draws the angles changed since the last paint right away, e.g. before
+        capturing the scene. Returns False when there was nothing to draw.
+        """
+        self.sweeps.fade(time.monotonic() if now is None else now)
+        dirty = self.scan.draw_sweeps(self.sweeps)
+        self.pending = 0
+        if dirty is None:
+            self.skipped += 1
+            return False
+        self.item.mark_dirty(dirty)
+        self.paints += 1
+        return True
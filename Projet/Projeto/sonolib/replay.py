@@ -0,0 +1,169 @@
+"""
+Replays a recording (or a CSV capture) through a pseudo-terminal, so the
+viewers can be driven without an Arduino:
+
+    python -m sonolib.replay session.swp --speed 2
+    python -m sonolib.replay capture.csv --max --loop
+
+The slave side of the pty (e.g. /dev/pts/5) is printed on startup; open it
+from the viewers like a real serial port. Lines are written exactly like the
+firmware prints them ("angle,e0,...,e79\\r\\n"), or as binary frames with
+--binary.
+"""
+import argparse
+import os
+import pty
+import termios
+import threading
+import time
+import tty
+
+import numpy as np
+
+from .framing import encode_frame
+from .parsing import parse_sweep_lines
+from .recording import SweepRecording, records_to_rows
+
+FIRMWARE_INTERVAL = 0.05  # delay(50) between lines in the firmware
+
+
+def format_lines(rows):
+    """Formats (n, 81) rows the way the firmware's Serial.print/println does."""
+    return b''.join((",".join(map(str, row)) + "\r\n").encode() for row in rows.tolist())
+
+
+def format_frames(rows, first_seq=0):
+    return b''.join(encode_frame(first_seq + i, row[0], row[1:]) for i, row in enumerate(rows))
+
+
+def iter_source(path, interval=FIRMWARE_INTERVAL, chunk=256):
+    """
+    Yields (rows, timestamps) batches from a recording, or from a CSV capture
+    in which case lines are spaced by `interval` seconds.
+    """
+    try:
+        recording = SweepRecording(path)
+    except ValueError:
+        recording = None
+
+    if recording is not None:
+        for records in recording.iter_chunks(chunk):
+            yield records_to_rows(records), np.asarray(records['t'], dtype=float)
+        return
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    rows, malformed = parse_sweep_lines(data)
+    rows = rows[~malformed]
+    for start in range(0, len(rows), chunk):
+        batch = rows[start:start + chunk]
+        yield batch, (start + np.arange(len(batch))) * interval
+
+
+class SweepReplayer:
+    def __init__(self, path, speed=1.0, binary=False, interval=FIRMWARE_INTERVAL, loop=False):
+        self.path = path
+        self.speed = speed  # 0 means as fast as the reader takes it
+        self.binary = binary
+        self.interval = interval
+        self.loop = loop
+        self.sent = 0
+
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)  # no echo and no newline translation, like a real port
+        self.port_name = os.ttyname(self.slave_fd)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="sweep-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        try:
+            termios.tcdrain(self.master_fd)  # let the reader take what is still buffered
+        except termios.error:
+            pass
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def run(self):
+        while not self._stop.is_set():
+            self._replay_once()
+            if not self.loop:
+                break
+
+    def _replay_once(self):
+        clock_start = time.monotonic()
+        t_first = None
+        for rows, timestamps in iter_source(self.path, self.interval):
+            if self._stop.is_set():
+                return
+            if t_first is None and len(timestamps):
+                t_first = timestamps[0]
+
+            if self.speed <= 0:
+                self._write(rows)
+                continue
+
+            # Real time or N x: send each frame when its (scaled) timestamp is due
+            due = clock_start + (timestamps - t_first) / self.speed
+            start = 0
+            while start < len(rows):
+                wait = due[start] - time.monotonic()
+                if wait > 0:
+                    if self._stop.wait(wait):
+                        return
+                stop = start + 1 + np.searchsorted(due[start + 1:], time.monotonic(), side='right')
+                self._write(rows[start:stop])
+                start = stop
+
+    def _write(self, rows):
+        if self.binary:
+            data = format_frames(rows, self.sent)
+        else:
+            data = format_lines(rows)
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master_fd, view)
+            view = view[written:]
+        self.sent += len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay sweeps through a pseudo-terminal.")
+    parser.add_argument("source", help="sweep recording or CSV capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 1 = real time")
+    parser.add_argument("--max", action="store_true", help="replay as fast as the reader accepts")
+    parser.add_argument("--binary", action="store_true", help="send binary frames instead of CSV lines")
+    parser.add_argument("--interval", type=float, default=FIRMWARE_INTERVAL,
+                        help="seconds between lines of a CSV capture")
+    parser.add_argument("--loop", action="store_true", help="start over at the end")
+    args = parser.parse_args()
+
+    replayer = SweepReplayer(args.source, speed=0 if args.max else args.speed,
+                             binary=args.binary, interval=args.interval, loop=args.loop)
+    print(f"Replaying {args.source} on {replayer.port_name}")
+    started = time.monotonic()
+    try:
+        replayer.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.monotonic() - started
+        print(f"Sent {replayer.sent} frames in {elapsed:.1f} s")
+        replayer.close()
+
+
+if __name__ == "__main__":
+    main()
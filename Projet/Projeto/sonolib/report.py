@@ -0,0 +1,341 @@
+"""
+HTML measurement reports, for the analyzer and in batch without a display:
+
+    python -m sonolib.report recordings/ -o reports/
+    python -m sonolib.report day1/*.swp day2/*.csv -o reports/ --jobs 8 --embed
+
+Each input is a sweep recording or CSV capture (what replay.iter_source
+reads; in directories, CSV files without sweep lines, such as measurement
+exports, are skipped); its final image is the "before" image of the report.
+Measurements come from the analyzer's Export Measurements saved next to it
+(same name, .npz; from a session of several images, those of the image
+named after the recording), otherwise every structure is measured
+automatically (echoes.find_calipers). The "after" image draws them on top.
+
+Inputs are reported in a process pool. Images go to the content-addressed
+asset store of the output directory (assets/, see sonolib.assets): an
+image is named after its pixels, so reports never overwrite each other's
+images, one shared by several reports is stored once, and running the
+batch again only encodes the images that changed. With --embed each report
+carries its images as data URIs instead. index.html links them all, with a
+thumbnail of each.
+"""
+import argparse
+import base64
+import html
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .assets import AssetStore, relative_url
+from .echoes import caliper_name, caliper_points, find_calipers
+from .export import CANVAS_SIZE, SweepImageRenderer, iter_sweeps
+from .measurements import MeasurementStore, read_image_names
+from .parsing import parse_sweep_lines
+from .persistence import SweepBuffer
+from .replay import iter_source
+
+SOURCE_EXTENSIONS = (".swp", ".csv")
+ASSET_DIR = "assets"
+INDEX_THUMBNAIL = 160  # px, longest side
+MEASUREMENT_COLOR = (255, 255, 255)
+
+STYLE = """
+    body {
+        font-family: sans-serif;
+        margin: 20px;
+    }
+
+    h1, h2 {
+        text-align: center;
+    }
+
+    img {
+        display: block;
+        max-width: 65%;
+        height: auto;
+        margin-bottom: 10px;
+        margin-left: auto;
+        margin-right: auto;
+    }
+
+    img.thumbnail {
+        max-width: none;
+        margin: 0;
+    }
+
+    table {
+        border-collapse: collapse;
+        width: 80%;
+        margin-right: auto;
+        margin-left: auto;
+    }
+
+    th, td {
+        border: 1px solid #ddd;
+        padding: 8px;
+        text-align: left;
+    }
+
+    th {
+        background-color: #f2f2f2;
+        text-align: center;
+        font-weight: bold;
+    }
+"""
+
+
+def _table(header, rows):
+    parts = ["<table><tr>", *(f"<th>{html.escape(h)}</th>" for h in header), "</tr>"]
+    for row in rows:
+        parts.append("<tr>" + "".join(f"<td>{html.escape(str(v))}</td>" for v in row) + "</tr>")
+    parts.append("</table>")
+    return "".join(parts)
+
+
+def report_html(title, before_src, after_src, measurements, statistics=None):
+    """
+    The report page. `measurements` is a sequence of (name, length in mm),
+    `statistics` an ordered dict of image properties.
+    """
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">",
+        f"<title>{html.escape(title)}</title><style>{STYLE}</style></head><body>",
+        f"<h1>{html.escape(title)}</h1>",
+        f"<img src=\"{before_src}\" alt=\"Image Load\">",
+        "<hr width=\"100%\" size=\"2\"><h2>Measurement Report</h2>",
+        _table(("Measurement", "Size"), ((name, f"{length:.2f} mm") for name, length in measurements)),
+    ]
+    if statistics:
+        parts += ["<hr width=\"100%\" size=\"2\"><h2>Image Statistics</h2>",
+                  _table(("Property", "Value"), statistics.items())]
+    parts += ["<hr width=\"100%\" size=\"2\"><h2>Rendered Scene</h2>",
+              f"<img src=\"{after_src}\" alt=\"Image after analyse\">", "</body></html>"]
+    return "\n".join(parts)
+
+
+def gray_statistics(gray, size=None):
+    """The analyzer's "Image Statistics" of a gray level array; `size` = (width, height) shown."""
+    height, width = gray.shape[:2]
+    width, height = size or (width, height)
+    return {
+        "Size": f"{width} x {height} px",
+        "Mean gray level": f"{gray.mean():.1f}",
+        "Standard deviation": f"{gray.std():.1f}",
+        "Min": f"{gray.min():.0f}",
+        "Max": f"{gray.max():.0f}",
+    }
+
+
+def draw_measurements(image, rows, color=MEASUREMENT_COLOR, width=2):
+    """RGB copy of a gray image with each measurement's line and length, like the analyzer's scene."""
+    canvas = Image.fromarray(image).convert("RGB")
+    draw = ImageDraw.Draw(canvas)
+    for row in rows:
+        draw.line((row['x0'], row['y0'], row['x1'], row['y1']), fill=color, width=width)
+        midpoint = ((row['x0'] + row['x1']) / 2, (row['y0'] + row['y1']) / 2)
+        draw.text(midpoint, f"{row['length_mm']:.2f} mm", fill=color)
+    return np.asarray(canvas)
+
+
+def png_bytes(image):
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def write_report(path, title, before, after, measurements, statistics=None, embed=False, store=None):
+    """
+    Writes the report page and its two images (uint8 arrays): into the
+    asset store (by default assets/ next to the page), or inline as data
+    URIs with `embed`. Returns the paths of the stored images, if any.
+    """
+    if embed:
+        stored = None
+        sources = ["data:image/png;base64," + base64.b64encode(png_bytes(image)).decode("ascii")
+                   for image in (before, after)]
+    else:
+        folder = os.path.dirname(path)
+        if store is None:
+            store = AssetStore(os.path.join(folder, ASSET_DIR))
+        stored = [store.put(image) for image in (before, after)]
+        sources = [relative_url(image, folder) for image in stored]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(report_html(title, *sources, measurements, statistics))
+    return stored
+
+
+def session_measurements(source):
+    """
+    Rows of the measurement export saved next to a recording, or None. An
+    export of several images only gives the rows of the image named after
+    the recording.
+    """
+    stem, _ = os.path.splitext(source)
+    path = stem + ".npz"
+    if not os.path.exists(path):
+        return None
+    store = MeasurementStore.read_npz(path)
+    image_ids = np.unique(store.table()['image_id'])
+    if len(image_ids) <= 1:
+        return store.table()
+    name = os.path.basename(stem)  # scan1.swp is the recording of the image scan1.png
+    matches = [i for i, image_name in read_image_names(path).items()
+               if os.path.splitext(image_name)[0] == name and i in image_ids]
+    if not matches:
+        raise ValueError(f"{os.path.basename(path)} holds measurements of {len(image_ids)} images, "
+                         "none named after this recording")
+    return store.table(store.select(image_id=matches))
+
+
+def auto_measurements(sweeps, center):
+    calipers = find_calipers(sweeps.data, sweeps.angles, scanned=sweeps.seen)
+    rows = MeasurementStore()
+    for i, (caliper, (x0, y0, x1, y1)) in enumerate(zip(calipers, caliper_points(calipers, center))):
+        rows.append(i, caliper_name(caliper), (x0, y0), (x1, y1), float(caliper['length_mm']))
+    return rows.table()
+
+
+def report_recording(source, out_dir, name=None, mode="dots", size=CANVAS_SIZE, embed=False):
+    """
+    Builds the report of one recording (in a worker process) and returns a
+    summary for the index: name, report file, measurement count and mean.
+    """
+    if name is None:
+        name = os.path.splitext(os.path.basename(source))[0]
+    sweeps = SweepBuffer()
+    for rows in iter_sweeps(iter_source(source)):
+        sweeps.add_frames(rows)
+    if not sweeps.seen.any():
+        raise ValueError("no sweep lines in this file")
+    renderer = SweepImageRenderer(size, mode)
+    before = renderer.render(sweeps)
+
+    rows = session_measurements(source)
+    origin = "session"
+    if rows is None:
+        width, height = size
+        rows = auto_measurements(sweeps, (width // 2, height))
+        origin = "auto"
+    after = draw_measurements(before, rows)
+
+    path = os.path.join(out_dir, f"{name}.html")
+    measurements = list(zip(rows['name'], rows['length_mm']))
+    store = AssetStore(os.path.join(out_dir, ASSET_DIR))
+    stored = write_report(path, f"Scene Report - {name}", before, after, measurements,
+                          gray_statistics(before), embed, store)
+    thumbnail = None
+    if stored is not None:
+        thumbnail = relative_url(store.thumbnail(stored[1], INDEX_THUMBNAIL), out_dir)
+    return {
+        "name": name,
+        "report": os.path.basename(path),
+        "count": len(rows),
+        "mean": float(rows['length_mm'].mean()) if len(rows) else None,
+        "origin": origin,
+        "thumbnail": thumbnail,
+    }
+
+
+def write_index(out_dir, summaries, failures=()):
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">",
+        f"<title>Reports</title><style>{STYLE}</style></head><body><h1>Reports</h1>",
+        "<table><tr><th>Recording</th><th>Measurements</th><th>Mean size</th><th>Measured by</th>"
+        "<th>Image</th></tr>",
+    ]
+    for s in summaries:
+        mean = "-" if s["mean"] is None else f"{s['mean']:.2f} mm"
+        link = html.escape(s['report'])
+        thumbnail = ""
+        if s.get("thumbnail"):
+            thumbnail = f"<a href=\"{link}\"><img class=\"thumbnail\" src=\"{s['thumbnail']}\" alt=\"\"></a>"
+        parts.append(f"<tr><td><a href=\"{link}\">{html.escape(s['name'])}</a></td>"
+                     f"<td>{s['count']}</td><td>{mean}</td><td>{s['origin']}</td><td>{thumbnail}</td></tr>")
+    parts.append("</table>")
+    if failures:
+        parts += ["<h2>Failed</h2>", _table(("Input", "Error"), failures)]
+    parts.append("</body></html>")
+    path = os.path.join(out_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+    return path
+
+
+def is_capture(path, probe=4096):
+    """True for recordings, and for CSV files with a sweep line in their first `probe` bytes."""
+    if os.path.splitext(path)[1].lower() != ".csv":
+        return True
+    with open(path, "rb") as f:
+        head = f.read(probe)
+    head = head[:head.rfind(b"\n") + 1]
+    if not head:
+        return False
+    _, malformed = parse_sweep_lines(head)
+    return not malformed.all()
+
+
+def find_sources(inputs):
+    """
+    Files given directly, and the recordings found in directories given
+    (CSV files there only if they hold sweep lines).
+    """
+    sources = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                sources += [os.path.join(root, f) for f in sorted(files)
+                            if os.path.splitext(f)[1].lower() in SOURCE_EXTENSIONS
+                            and is_capture(os.path.join(root, f))]
+        else:
+            sources.append(item)
+    return sources
+
+
+def unique_names(sources):
+    """Report names from the file names, numbered when two recordings share one."""
+    names, seen = [], {}
+    for source in sources:
+        name = os.path.splitext(os.path.basename(source))[0]
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return names
+
+
+def report_all(sources, out_dir, mode="dots", size=CANVAS_SIZE, embed=False, jobs=None):
+    """Reports every source in a process pool; returns (index path, summaries, failures)."""
+    os.makedirs(out_dir, exist_ok=True)
+    summaries, failures = [], []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(report_recording, source, out_dir, name, mode, size, embed): source
+                   for source, name in zip(sources, unique_names(sources))}
+        for future in as_completed(futures):
+            try:
+                summaries.append(future.result())
+            except Exception as e:  # one bad recording must not stop the batch
+                failures.append((futures[future], str(e)))
+    summaries.sort(key=lambda s: s["name"])
+    return write_index(out_dir, summaries, failures), summaries, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build HTML reports for many recordings at once.")
+    parser.add_argument("inputs", nargs="+", help="recordings, CSV captures or directories of them")
+    parser.add_argument("-o", "--output", default="reports", help="output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--mode", choices=("dots", "bmode"), default="dots")
+    parser.add_argument("--embed", action="store_true", help="images inside the HTML, no asset store")
+    args = parser.parse_args()
+
+    sources = find_sources(args.inputs)
+    index, summaries, failures = report_all(sources, args.output, args.mode, embed=args.embed, jobs=args.jobs)
+    print(f"Wrote {len(summaries)} report(s), index: {index}")
+    for source, error in failures:
+        print(f"Failed: {source}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Raster scan conversion of A-lines into a single grayscale framebuffer.
+
+Each echo bin is stamped as an 8 pixel dot at (n * 12.5) along the ray of its
+angle, exactly where the old viewers placed one QGraphicsEllipseItem per
+sample. The buffer has a fixed size, so the cost of drawing a frame does not
+depend on how long the acquisition has been running.
+With interpolate=True, draw_sweeps() fills the sector with a continuous
+B-mode image (reconstruct.SectorReconstructor) instead of discrete dots.
+"""
+import numpy as np
+
+from .geometry import ANGLE_BOUNDS, BIN_SPACING, DOT_SIZE, get_geometry
+from .parsing import N_ECHOES
+from .reconstruct import GAP_FILL, SectorReconstructor
+
+
+class ScanConverter:
+    """
+    `center` is the radar origin in scene coordinates. The buffer only covers
+    the area the sector can reach; `origin` is the scene position of its top
+    left corner.
+    """
+
+    def __init__(self, center, n_bins=N_ECHOES, bin_spacing=BIN_SPACING, dot_size=DOT_SIZE,
+                 angle_bounds=ANGLE_BOUNDS, interpolate=False):
+        self.n_bins = n_bins
+        self.bin_spacing = bin_spacing
+        self.dot_size = dot_size
+        self.angle_bounds = angle_bounds
+        self.interpolate = interpolate
+        self.set_center(center)
+
+    def set_center(self, center):
+        """
+        Moves the radar origin; the lookup tables and the buffer follow the new
+        geometry, so a RasterItem showing the old buffer has to be rebuilt.
+        """
+        self.center = tuple(center)
+        self.geometry = get_geometry(self.center, self.angle_bounds, self.n_bins,
+                                     self.bin_spacing, self.dot_size)
+        self.origin = self.geometry.origin
+        self.buffer = np.zeros(self.geometry.shape, dtype=np.uint8)
+        self.reconstructor = None
+        if self.interpolate:
+            local_center = (self.center[0] - self.origin[0], self.center[1] - self.origin[1])
+            self.reconstructor = SectorReconstructor(self.geometry.shape, local_center, 1.0,
+                                                     self.angle_bounds, self.n_bins, self.bin_spacing)
+
+    @property
+    def shape(self):
+        return self.buffer.shape
+
+    def clear(self):
+        self.buffer.fill(0)
+
+    def draw_line(self, angle, echoes):
+        """
+        Writes one A-line. Bin 0 and empty bins are skipped as before, so they
+        leave whatever was drawn there; angles outside the sector are ignored.
+        Returns the dirty rectangle (x0, y0, x1, y1) in buffer pixels, or None
+        if nothing was drawn.
+        """
+        row = self.geometry.angle_index(angle)
+        if row is None:
+            return None
+        echoes = np.asarray(echoes)[:self.n_bins]
+        keep = echoes > 0
+        keep[0] = False
+        if not keep.any():
+            return None
+
+        index = self.geometry.dot_index[row][keep]
+        values = np.broadcast_to(np.minimum(echoes[keep], 255).astype(np.uint8)[:, None], index.shape)
+        inside = index >= 0
+        self.buffer.reshape(-1)[index[inside]] = values[inside]
+
+        rect = self.geometry.dot_rect[row][keep]
+        return (int(rect[:, 0].min()), int(rect[:, 1].min()),
+                int(rect[:, 2].max()), int(rect[:, 3].max()))
+
+    def draw_rows(self, rows, values):
+        """
+        Redraws whole angles from a persistence store: rows are table rows
+        (angle + angle_bounds) and values their (len(rows), n_bins) echoes.
+        Unlike draw_line, empty bins are drawn too so old echoes disappear.
+        """
+        if len(rows) == 0:
+            return None
+        index = self.geometry.dot_index[rows, 1:]
+        levels = np.clip(values[:, 1:self.n_bins], 0, 255).astype(np.uint8)
+        levels = np.broadcast_to(levels[..., None], index.shape)
+        inside = index >= 0
+        self.buffer.reshape(-1)[index[inside]] = levels[inside]
+
+        rect = self.geometry.dot_rect[rows, 1:]
+        return (int(rect[..., 0].min()), int(rect[..., 1].min()),
+                int(rect[..., 2].max()), int(rect[..., 3].max()))
+
+    def draw_sweeps(self, sweeps):
+        """Redraws the angles of a SweepBuffer that changed since the last call."""
+        rows = sweeps.take_dirty()
+        if self.reconstructor is None:
+            return self.draw_rows(rows, sweeps.data[rows])
+        if len(rows) == 0:
+            return None
+        self.reconstructor.render(sweeps.data, sweeps.seen, out=self.buffer)
+        # Interpolation and gap filling only reach a few angles beyond the changed ones
+        reach = GAP_FILL + 1
+        return self.sector_rect(rows.min() - reach, rows.max() + reach)
+
+    def sector_rect(self, first_row, last_row):
+        """Buffer rectangle covering every bin of the table rows first_row..last_row."""
+        first_row = max(int(first_row), 0)
+        last_row = min(int(last_row), len(self.geometry.angles) - 1)
+        rect = self.geometry.dot_rect[first_row:last_row + 1]
+        return (int(rect[..., 0].min()), int(rect[..., 1].min()),
+                int(rect[..., 2].max()), int(rect[..., 3].max()))
+
+    def draw_frames(self, frames):
+        """Writes (n, 81) angle + echoes rows in order and returns the union of their dirty rectangles."""
+        dirty = None
+        for row in np.asarray(frames):
+            dirty = union_rect(dirty, self.draw_line(int(row[0]), row[1:]))
+        return dirty
+
+
+def union_rect(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
@@ -0,0 +1,93 @@
+"""
+Captures one complete sweep from the serial port and renders it in-process.
+
+Replaces the old "run the Processing sketch, wait for its window, take a
+screenshot" acquisition: the serial thread collects the lines, a Qt timer
+feeds them to a SweepSplitter, and as soon as a full sweep (turning point to
+turning point) has arrived it is scan-converted with the headless renderer
+and handed over as a (height, width) uint8 image. Nothing blocks the GUI
+thread and the image is pixel exact, whatever the screen DPI.
+"""
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from .acquisition import SerialAcquisition
+from .export import CANVAS_SIZE, SweepImageRenderer, SweepSplitter
+from .persistence import SweepBuffer
+from .recording import SweepRecorder
+
+SWEEP_SPAN = 80  # degrees covered by one firmware sweep (-40..40), for the progress and the first sweep check
+
+
+class SweepCapture(QObject):
+    progress = pyqtSignal(int)      # percentage of the sweep received
+    finished = pyqtSignal(object)   # rendered image (uint8 array)
+    failed = pyqtSignal(str)
+
+    def __init__(self, port_name, mode="dots", size=CANVAS_SIZE, poll_interval=20, recorder_path=None,
+                 parent=None):
+        super().__init__(parent)
+        self.port_name = port_name
+        self.recorder_path = recorder_path  # raw lines of each capture are recorded there too, if set
+        self.mode = mode
+        self.size = size
+        self.acquisition = None
+        self.splitter = SweepSplitter()
+        self.sweep = None  # rows of the last captured sweep
+        self.timer = QTimer(self)
+        self.timer.setInterval(poll_interval)
+        self.timer.timeout.connect(self._poll)
+
+    def start(self):
+        """Opens the port and starts waiting for a sweep; raises like serial.Serial on failure."""
+        self.splitter.reset()
+        recorder = SweepRecorder(self.recorder_path) if self.recorder_path else None
+        self.acquisition = SerialAcquisition(self.port_name, recorder=recorder)
+        try:
+            self.acquisition.start()
+        except Exception:
+            self.acquisition = None
+            if recorder is not None:
+                recorder.close()
+            raise
+        self.timer.start()
+        self.progress.emit(0)
+
+    def stop(self):
+        self.timer.stop()
+        if self.acquisition is not None:
+            self.acquisition.stop()
+            self.acquisition = None
+
+    @property
+    def is_running(self):
+        return self.timer.isActive()
+
+    def _poll(self):
+        if not self.acquisition.is_running:
+            error = self.acquisition.error
+            self.stop()
+            self.failed.emit(f"Connection to {self.port_name} lost." + (f" ({error})" if error else ""))
+            return
+        done = self.splitter.feed(self.acquisition.drain())
+        first = self.splitter.count - len(done)
+        for i, sweep in enumerate(done):
+            # The first one started wherever the servo was when we connected
+            if first + i > 0 or self._is_full(sweep):
+                self.stop()
+                self.sweep = sweep
+                self.progress.emit(100)
+                self.finished.emit(self.render(sweep))
+                return
+        current = self.splitter.current()
+        if len(current):
+            span = int(current[:, 0].max() - current[:, 0].min())
+            self.progress.emit(min(99, 100 * span // SWEEP_SPAN))
+
+    @staticmethod
+    def _is_full(sweep):
+        return sweep[:, 0].max() - sweep[:, 0].min() >= SWEEP_SPAN
+
+    def render(self, sweep):
+        sweeps = SweepBuffer()
+        sweeps.add_frames(sweep)
+        return SweepImageRenderer(self.size, self.mode).render(sweeps)
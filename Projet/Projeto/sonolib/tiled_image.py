@@ -0,0 +1,613 @@
+"""
+Tile pyramid display for images too large to decode at once.
+
+Opening only reads the image size. TiledImageItem then asks for the tiles
+the view exposes, at the pyramid level that matches the zoom (level n is the
+image scaled down 2**n times, in TILE_SIZE tiles), decodes them on a
+QThreadPool and keeps them in an LRU cache bounded in bytes, so memory
+follows what is on screen. Until a tile arrives, the best coarser tile
+already cached is drawn stretched in its place.
+
+Sources:
+
+    ArraySource       a (h, w) or (h, w, c) uint8 array, e.g. a memory-mapped
+                      .npy from sonolib.export; a tile is a strided slice
+    ImageFileSource   a file whose QImageReader decodes a clip rect alone
+                      (JPEG, scaled while decoding); a tile reads only its part
+    PyramidSource     every other format (PNG, BMP, TIFF: Qt ignores the clip
+                      rect and would decode the whole file for each tile). The
+                      file is read once, band by band, into memory-mapped .npy
+                      levels kept on disk while it is unchanged. PyramidBuilder
+                      does it in the background and hands the pyramid over as
+                      soon as it exists: shown, it fills up from the top.
+"""
+import glob
+import math
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+from PyQt5.QtCore import QObject, QRect, QRectF, QRunnable, QSize, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImageIOHandler, QImageReader, QPixmap
+from PyQt5.QtWidgets import QGraphicsItem, QGraphicsObject
+
+from .assets import file_key
+from .qimage_bridge import array_to_qimage
+
+TILE_SIZE = 512
+CACHE_BUDGET = 256 * 1024 * 1024  # bytes of decoded tiles kept
+PYRAMID_DIR = os.path.join(tempfile.gettempdir(), "sonolib-pyramids")
+PYRAMID_COMPLETE = "complete"  # marker written once every level is on disk
+STRIP_ROWS = 256  # image rows decoded at a time while building a pyramid
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}  # color type -> Pillow mode, at 8 bits
+
+
+class ArraySource:
+    """uint8 pixels, any layout qimage_bridge.array_to_qimage takes."""
+
+    def __init__(self, array):
+        self.array = array
+        self.height, self.width = array.shape[:2]
+
+    def decode(self, rect, size):
+        """QImage of the source pixels in `rect` (QRect), reduced to about `size`."""
+        step = max(1, round(rect.width() / max(size.width(), 1)))
+        pixels = self.array[rect.top():rect.bottom() + 1:step, rect.left():rect.right() + 1:step]
+        return array_to_qimage(np.ascontiguousarray(pixels))
+
+
+class ImageFileSource:
+    def __init__(self, path):
+        self.path = path
+        reader = QImageReader(path)
+        size = reader.size()
+        if not reader.canRead() or not size.isValid():
+            raise ValueError(f"Cannot read image: {path} ({reader.errorString()})")
+        self.width, self.height = size.width(), size.height()
+        self.can_clip = reader.supportsOption(QImageIOHandler.ClipRect)
+
+    def decode(self, rect, size):
+        reader = QImageReader(self.path)  # one reader per call: decoding runs on several threads
+        reader.setClipRect(rect)
+        reader.setScaledSize(size)
+        return reader.read()
+
+
+class PyramidSource:
+    """Memory-mapped levels of an image, level n scaled down 2**n times."""
+
+    def __init__(self, levels):
+        self.levels = levels
+        self.height, self.width = levels[0].shape[:2]
+
+    @classmethod
+    def open(cls, directory):
+        paths = sorted(glob.glob(os.path.join(directory, "level_*.npy")))
+        return cls([np.load(path, mmap_mode="r") for path in paths])
+
+    def decode(self, rect, size):
+        # Smallest level that still has the pixels asked for
+        n = 0
+        while (n + 1 < len(self.levels) and rect.width() >> (n + 1) >= size.width()
+               and rect.height() >> (n + 1) >= size.height()):
+            n += 1
+        level = self.levels[n]
+        height, width = level.shape[:2]
+        x0, y0 = min(rect.left() >> n, width - 1), min(rect.top() >> n, height - 1)
+        x1 = min(-(-(rect.right() + 1) >> n), width)
+        y1 = min(-(-(rect.bottom() + 1) >> n), height)
+        return ArraySource(level).decode(QRect(x0, y0, max(1, x1 - x0), max(1, y1 - y0)), size)
+
+
+def _new_level(directory, n, shape):
+    """Path of a new level file, its size set but no pixel written (see _LevelWriter)."""
+    path = os.path.join(directory, f"level_{n:02d}.npy")
+    level = np.lib.format.open_memmap(path, "w+", np.uint8, shape)
+    del level
+    return path
+
+
+def _png_header(path):
+    """(width, height, Pillow mode) of an 8-bit non-interlaced PNG file, None for any other file."""
+    with open(path, "rb") as f:
+        head = f.read(len(PNG_SIGNATURE) + 8 + 13)
+    if len(head) < 29 or head[:8] != PNG_SIGNATURE or head[12:16] != b"IHDR":
+        return None
+    width, height, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", head[16:29])
+    if depth != 8 or interlace or color not in PNG_MODES:
+        return None
+    return width, height, PNG_MODES[color]
+
+
+def _png_stream(path, piece_size=1 << 16):
+    """(b"PLTE", palette), then (b"IDAT", data) pieces of a PNG file's stream, inflated as it is read."""
+    inflate = zlib.decompressobj()
+    with open(path, "rb") as f:
+        f.seek(len(PNG_SIGNATURE))
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"Truncated PNG file: {path}")
+            length, kind = struct.unpack(">I4s", header)
+            if kind == b"IEND":
+                break
+            if kind == b"PLTE":
+                yield kind, f.read(length)
+                length = 0
+            elif kind == b"IDAT":
+                while length:
+                    data = f.read(min(length, piece_size))
+                    if not data:
+                        raise ValueError(f"Truncated PNG file: {path}")
+                    length -= len(data)
+                    while data:  # bounded output per call, whatever the compression ratio
+                        try:
+                            pixels = inflate.decompress(data, piece_size)
+                        except zlib.error as e:
+                            raise ValueError(f"Corrupt PNG file: {path} ({e})")
+                        yield kind, pixels
+                        data = inflate.unconsumed_tail
+            f.seek(length + 4, os.SEEK_CUR)  # the rest of the chunk and its CRC
+    yield b"IDAT", inflate.flush()
+
+
+def _unfilter(mode, width, previous, scanlines):
+    """
+    Pillow image of PNG scanlines (filter byte + row each), unfiltered by
+    Pillow's own PNG decoder. `previous` is the raw row above them: it goes
+    first, unfiltered, so the filters of the first scanline see it.
+    """
+    count = len(scanlines) // (len(previous) + 1)
+    data = zlib.compress(b"\0" + previous + scanlines, 0)  # stored blocks: nothing to compress again
+    rows = Image.frombytes(mode, (width, count + 1), data, "zip", mode)
+    return rows.crop((0, 1, width, count + 1)), rows.crop((0, count, width, count + 1)).tobytes()
+
+
+def _png_strips(path, width, height, mode, rows):
+    row_bytes = 1 + width * Image.getmodebands(mode)
+    previous = bytes(row_bytes - 1)  # zeros above the first row
+    palette = None
+    scanlines = bytearray()
+    top = 0
+    for kind, data in _png_stream(path):
+        if kind == b"PLTE":
+            palette = data
+            continue
+        scanlines += data
+        while top < height and len(scanlines) >= min(rows, height - top) * row_bytes:
+            count = min(rows, height - top)
+            band, previous = _unfilter(mode, width, previous, bytes(scanlines[:count * row_bytes]))
+            del scanlines[:count * row_bytes]
+            if palette is not None:
+                band.putpalette(palette)
+            top += count
+            yield band
+    if top < height:
+        raise ValueError(f"Truncated PNG file: {path}")
+
+
+def _raw_layout(image):
+    """
+    (top, bottom, offset, stride, ystep, rawmode) of every tile of an
+    uncompressed image stored in full-width tiles (BMP, plain TIFF), top to
+    bottom, or None when it is stored otherwise.
+    """
+    layout = []
+    for name, (x0, y0, x1, y1), offset, args in sorted(image.tile, key=lambda tile: tile[1][1]):
+        args = (args,) if isinstance(args, str) else tuple(args)
+        rawmode, stride, ystep = args[0], args[1] if len(args) > 1 else 0, args[2] if len(args) > 2 else 1
+        if name != "raw" or (x0, x1) != (0, image.width) or y0 != (layout[-1][1] if layout else 0):
+            return None
+        if stride <= 0:
+            try:
+                stride = len(Image.new(image.mode, (image.width, 1)).tobytes("raw", rawmode))
+            except (ValueError, OSError):
+                return None
+        layout.append((y0, y1, offset, stride, ystep, rawmode))
+    return layout if layout and layout[-1][1] == image.height else None
+
+
+def _pillow_strips(image, path, rows):
+    with image:
+        layout = _raw_layout(image)
+        if layout is None:
+            # Decoded whole by Pillow (on the first crop), then cut
+            for top in range(0, image.height, rows):
+                yield image.crop((0, top, image.width, min(top + rows, image.height)))
+            return
+        palette = image.getpalette() if image.mode == "P" else None
+        with open(path, "rb") as f:
+            for y0, y1, offset, stride, ystep, rawmode in layout:
+                for top in range(y0, y1, rows):
+                    count = min(rows, y1 - top)
+                    first = top - y0 if ystep > 0 else y1 - top - count  # rows stored bottom-up
+                    f.seek(offset + first * stride)
+                    band = Image.frombytes(image.mode, (image.width, count), f.read(count * stride),
+                                           "raw", rawmode, stride, ystep)
+                    if palette is not None:
+                        band.putpalette(palette)
+                    yield band
+
+
+def image_strips(path, rows=STRIP_ROWS):
+    """
+    (width, height) of an image file and an iterator over its rows, top to
+    bottom, as Pillow images of at most `rows` rows. Only a band is decoded
+    at a time where the format allows it: 8-bit non-interlaced PNG (the
+    stream is inflated as it is read) and uncompressed BMP or TIFF (read in
+    place). Other files (16-bit or interlaced PNG, compressed TIFF...) are
+    decoded whole by Pillow for the first band.
+    """
+    header = _png_header(path)
+    if header is not None:
+        width, height, mode = header
+        return (width, height), _png_strips(path, width, height, mode, rows)
+    image = Image.open(path)
+    return image.size, _pillow_strips(image, path, rows)
+
+
+def _is_gray(band):
+    if band.mode == "P":
+        palette = np.asarray(band.getpalette() or [], dtype=np.uint8).reshape(-1, 3)
+        return bool((palette == palette[:, :1]).all())
+    return Image.getmodebase(band.mode) == "L"
+
+
+def _band_pixels(band, gray):
+    """uint8 (rows, width) or (rows, width, 3) pixels of a band."""
+    if band.mode.startswith("I;16"):
+        return (np.asarray(band) >> 8).astype(np.uint8)
+    return np.asarray(band.convert("L" if gray else "RGB"))
+
+
+class _LevelWriter:
+    """
+    Writes bands of rows to level 0 and their 2x2 means to every level
+    above, as they come. Rows go through unbuffered files, not the maps:
+    the maps (read-only, for display) see them all the same, and written
+    pixels stay in the page cache instead of counting as this process' memory.
+    """
+
+    def __init__(self, paths):
+        self.levels = [np.load(path, mmap_mode="r") for path in paths]
+        self.files = [open(path, "r+b", buffering=0) for path in paths]
+        self.filled = [0] * len(paths)
+        self.carry = [None] * len(paths)  # last row of a level still waiting for its pair
+
+    def write(self, block, n=0):
+        level = self.levels[n]
+        block = np.ascontiguousarray(block[:level.shape[0] - self.filled[n], :level.shape[1]])
+        self.files[n].seek(level.offset + self.filled[n] * level.strides[0])
+        self.files[n].write(block)
+        self.filled[n] += len(block)
+        if n + 1 == len(self.levels):
+            return
+        if self.carry[n] is not None:
+            block = np.concatenate([self.carry[n], block])
+        pairs = len(block) - len(block) % 2
+        self.carry[n] = block[pairs:] if pairs < len(block) else None
+        if pairs:
+            width = self.levels[n + 1].shape[1]
+            block = block[:pairs, :2 * width].astype(np.uint16)
+            self.write(((block[0::2, 0::2] + block[1::2, 0::2] + block[0::2, 1::2] + block[1::2, 1::2] + 2)
+                        // 4).astype(np.uint8), n + 1)
+
+    def close(self):
+        for file in self.files:
+            file.close()
+
+
+def cached_pyramid(path, root=PYRAMID_DIR):
+    """PyramidSource of a file from an earlier, complete build_pyramid, or None."""
+    for marker in sorted(glob.glob(os.path.join(root, file_key(path) + ".*", PYRAMID_COMPLETE))):
+        return PyramidSource.open(os.path.dirname(marker))
+    return None
+
+
+def build_pyramid(path, root=PYRAMID_DIR, tile_size=TILE_SIZE, rows=STRIP_ROWS,
+                  started=None, progress=None, cancelled=None):
+    """
+    PyramidSource of an image file, built without ever holding the whole
+    image: the file is read band by band (image_strips), gray when it has
+    no color, and each band goes to every level of root/<file key>.<pid>/
+    at once. started(source) gets the pyramid as soon as its files exist
+    (it fills up from the top), progress(top, bottom) the image rows just
+    written. cancelled() is asked after every band; the build then stops,
+    removes its files and returns None. A marker file written last tells
+    cached_pyramid() the pyramid is complete.
+    """
+    (width, height), strips = image_strips(path, rows)
+    directory = os.path.join(root, f"{file_key(path)}.{os.getpid()}")
+    os.makedirs(directory, exist_ok=True)
+    writer, complete = None, False
+    try:
+        for band in strips:
+            if writer is None:
+                gray = _is_gray(band)
+                shapes = [(height, width)]
+                while max(shapes[-1]) > tile_size:
+                    shapes.append((shapes[-1][0] // 2, shapes[-1][1] // 2))
+                channels = () if gray else (3,)
+                writer = _LevelWriter([_new_level(directory, n, shape + channels)
+                                       for n, shape in enumerate(shapes)])
+                source = PyramidSource(writer.levels)
+                if started is not None:
+                    started(source)
+            top = writer.filled[0]
+            writer.write(_band_pixels(band, gray))
+            if progress is not None:
+                progress(top, writer.filled[0])
+            if cancelled is not None and cancelled():
+                return None
+        if writer is None:
+            raise ValueError(f"Cannot read image: {path}")
+        complete = True
+    finally:
+        if writer is not None:
+            writer.close()
+        if complete:
+            open(os.path.join(directory, PYRAMID_COMPLETE), "w").close()
+        else:
+            shutil.rmtree(directory, ignore_errors=True)  # cancelled or failed: no partial pyramid left
+    return source
+
+
+def open_image_source(path):
+    """
+    ArraySource over a memory-mapped .npy, ImageFileSource for anything else
+    (only reads the image size; see tile_source before showing it tiled).
+    """
+    if os.path.splitext(path)[1].lower() == ".npy":
+        return ArraySource(np.load(path, mmap_mode="r"))
+    return ImageFileSource(path)
+
+
+def tile_source(source):
+    """
+    `source`, or the pyramid of its file if its format cannot decode a tile
+    alone: None while that pyramid is still to be built (PyramidBuilder).
+    """
+    if isinstance(source, ImageFileSource) and not source.can_clip:
+        return cached_pyramid(source.path)
+    return source
+
+
+class _PyramidJob(QRunnable):
+    def __init__(self, builder, path):
+        super().__init__()
+        self.builder = builder
+        self.path = path
+
+    def run(self):
+        builder, path = self.builder, self.path
+        try:
+            source = build_pyramid(path, builder.root,
+                                   started=lambda source: builder.started.emit(path, source),
+                                   progress=lambda top, bottom: builder.progress.emit(path, top, bottom),
+                                   cancelled=lambda: builder.stopping)
+        except (ValueError, OSError, Image.DecompressionBombError) as e:
+            builder.failed.emit(path, str(e))
+            return
+        if source is not None:
+            builder.ready.emit(path, source)
+
+
+class PyramidBuilder(QObject):
+    """
+    Runs build_pyramid on a thread pool; the signals arrive on the GUI
+    thread, started as soon as the pyramid can be shown.
+    """
+    started = pyqtSignal(str, object)    # path, PyramidSource still filling up
+    progress = pyqtSignal(str, int, int)  # path, image rows just written (top, bottom)
+    ready = pyqtSignal(str, object)      # path, complete PyramidSource
+    failed = pyqtSignal(str, str)        # path, error message
+
+    def __init__(self, root=PYRAMID_DIR, max_threads=1, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.stopping = False
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+
+    def build(self, path):
+        self.pool.start(_PyramidJob(self, path))
+
+    def stop(self):
+        """Cancels the builds (their files are removed) and waits for them."""
+        self.stopping = True
+        self.blockSignals(True)
+        self.pool.clear()
+        self.pool.waitForDone()
+
+
+class TileCache:
+    """LRU of tile pixmaps by key, evicting the least recently drawn over `budget` bytes."""
+
+    def __init__(self, budget=CACHE_BUDGET):
+        self.budget = budget
+        self.bytes = 0
+        self.tiles = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.tiles
+
+    def get(self, key):
+        pixmap = self.tiles.get(key)
+        if pixmap is not None:
+            self.tiles.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self.tiles:
+            self.bytes -= self._size(self.tiles.pop(key))
+        self.tiles[key] = pixmap
+        self.bytes += self._size(pixmap)
+        while self.bytes > self.budget and len(self.tiles) > 1:
+            _, old = self.tiles.popitem(last=False)
+            self.bytes -= self._size(old)
+
+    def clear(self):
+        self.tiles.clear()
+        self.bytes = 0
+
+    @staticmethod
+    def _size(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class _DecodeJob(QRunnable):
+    def __init__(self, source, signal, key, rect, size):
+        super().__init__()
+        self.source = source
+        self.signal = signal
+        self.key = key
+        self.rect = rect
+        self.size = size
+
+    def run(self):
+        self.signal.emit(self.key, self.source.decode(self.rect, self.size))
+
+
+class TiledImageItem(QGraphicsObject):
+    overview_ready = pyqtSignal(object)  # QImage asked for with request_overview()
+    _decoded = pyqtSignal(object, object)  # key, QImage; delivered on the GUI thread
+    _overview_decoded = pyqtSignal(object, object)
+
+    def __init__(self, source, tile_size=TILE_SIZE, budget=CACHE_BUDGET, max_threads=2, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.tile_size = tile_size
+        self.cache = TileCache(budget)
+        self.pending = set()  # keys being decoded
+        self.stale = set()  # keys being decoded from pixels that changed since (see refresh)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        # Level where the whole image fits in one tile
+        self.levels = max(1, math.ceil(math.log2(max(source.width, source.height) / tile_size)) + 1)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # gives paint() the exposed rect
+        self._decoded.connect(self._on_decoded)
+        self._overview_decoded.connect(lambda _, image: self.overview_ready.emit(image))
+        self.request((self.levels - 1, 0, 0))  # the single top tile: something to show anywhere
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.source.width, self.source.height)
+
+    def level_for(self, scale):
+        """Pyramid level to draw at a view scale (1 = one image pixel per screen pixel)."""
+        if scale <= 0:
+            return self.levels - 1
+        return min(max(int(math.floor(math.log2(1 / scale))), 0), self.levels - 1)
+
+    def tile_rect(self, level, col, row):
+        """Source pixels covered by a tile, clipped to the image."""
+        span = self.tile_size << level
+        return QRect(col * span, row * span, span, span).intersected(
+            QRect(0, 0, self.source.width, self.source.height))
+
+    def tile_pixels(self, level, rect):
+        scale = 1 << level
+        return QSize(max(1, math.ceil(rect.width() / scale)), max(1, math.ceil(rect.height() / scale)))
+
+    def paint(self, painter, option, widget=None):
+        scale = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.level_for(scale)
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        span = self.tile_size << level
+        cols = range(int(exposed.left()) // span, int(math.ceil(exposed.right())) // span + 1)
+        rows = range(int(exposed.top()) // span, int(math.ceil(exposed.bottom())) // span + 1)
+        for row in rows:
+            for col in cols:
+                key = (level, col, row)
+                rect = self.tile_rect(*key)
+                if rect.isEmpty():
+                    continue
+                pixmap = self.cache.get(key)
+                if pixmap is None and widget is None:
+                    # Rendering to an image (scene snapshot): no later repaint, decode now
+                    pixmap = self._store(key, self.source.decode(rect, self.tile_pixels(level, rect)))
+                if pixmap is not None:
+                    painter.drawPixmap(QRectF(rect), pixmap, QRectF(pixmap.rect()))
+                else:
+                    self.request(key)
+                    self._draw_coarser(painter, key, rect)
+
+    def _draw_coarser(self, painter, key, rect):
+        level, col, row = key
+        for coarser in range(level + 1, self.levels):
+            shift = coarser - level
+            parent = (coarser, col >> shift, row >> shift)
+            pixmap = self.cache.get(parent)
+            if pixmap is not None:
+                parent_rect = self.tile_rect(*parent)
+                scale = 1 << coarser
+                source = QRectF((rect.left() - parent_rect.left()) / scale, (rect.top() - parent_rect.top()) / scale,
+                                rect.width() / scale, rect.height() / scale)
+                painter.drawPixmap(QRectF(rect), pixmap, source)
+                return
+
+    def request(self, key):
+        if key in self.pending or key in self.cache:
+            return
+        self._start(key)
+
+    def refresh(self, rect):
+        """
+        Decodes again the tiles decoded so far over `rect` (QRect of source
+        pixels), e.g. while a pyramid is being written; they stay drawn meanwhile.
+        """
+        for key in list(self.cache.tiles) + list(self.pending):
+            if self.tile_rect(*key).intersects(rect):
+                if key in self.pending:
+                    self.stale.add(key)
+                else:
+                    self._start(key)
+
+    def _start(self, key):
+        rect = self.tile_rect(*key)
+        self.pending.add(key)
+        self.pool.start(_DecodeJob(self.source, self._decoded, key, rect, self.tile_pixels(key[0], rect)))
+
+    def _store(self, key, image):
+        if image.isNull():
+            return None
+        pixmap = QPixmap.fromImage(image)
+        self.cache.put(key, pixmap)
+        return pixmap
+
+    def _on_decoded(self, key, image):
+        self.pending.discard(key)
+        if self._store(key, image) is not None:
+            self.update(QRectF(self.tile_rect(*key)))
+        if key in self.stale:
+            self.stale.discard(key)
+            self._start(key)
+
+    def overview(self, max_size=TILE_SIZE):
+        """Whole image scaled to fit `max_size` (decoded now, on the calling thread)."""
+        rect = QRect(0, 0, self.source.width, self.source.height)
+        return self.source.decode(rect, self._overview_size(max_size))
+
+    def request_overview(self, max_size=TILE_SIZE):
+        """Same as overview(), decoded in the background and sent with overview_ready."""
+        rect = QRect(0, 0, self.source.width, self.source.height)
+        self.pool.start(_DecodeJob(self.source, self._overview_decoded, None, rect, self._overview_size(max_size)))
+
+    def _overview_size(self, max_size):
+        scale = max(self.source.width, self.source.height) / max_size
+        return QSize(max(1, round(self.source.width / scale)), max(1, round(self.source.height / scale)))
+
+    def stop(self):
+        """Drops queued decodes and waits for the running ones (before the item goes away)."""
+        self.blockSignals(True)  # results still in flight are dropped, overview_ready included
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.pending.clear()
+        self.stale.clear()
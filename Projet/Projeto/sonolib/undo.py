@@ -0,0 +1,162 @@
+"""
+Undo commands for the analyzer, on top of QUndoStack.
+
+Each edit is one QUndoCommand that changes the scene and the
+AnnotationRegistry together (so measurement records come and go with their
+line and label). A multi-delete or a style change over many items is a
+single command, consecutive moves or restyles of the same items merge into
+one step, and the stack's undo limit bounds how many removed items are kept
+alive for redo/undo.
+"""
+from contextlib import contextmanager
+
+from PyQt5.QtWidgets import QGraphicsTextItem, QUndoCommand
+
+MOVE_ID = 1
+RESTYLE_ID = 2
+
+
+def show_annotation(scene, registry, annotation):
+    for item in annotation.items:
+        if item.scene() is not scene:  # a new measurement is already shown while it is named
+            scene.addItem(item)
+    registry.restore(annotation)
+
+
+def hide_annotation(scene, registry, annotation):
+    for item in annotation.items:
+        scene.removeItem(item)
+    registry.remove(annotation.id)
+
+
+class AddAnnotations(QUndoCommand):
+    """Adds annotations created with AnnotationRegistry.new()."""
+
+    def __init__(self, scene, registry, annotations, text="Add annotation"):
+        super().__init__(text)
+        self.scene = scene
+        self.registry = registry
+        self.annotations = list(annotations)
+
+    def redo(self):
+        with frozen_views(self.scene):
+            for annotation in self.annotations:
+                show_annotation(self.scene, self.registry, annotation)
+
+    def undo(self):
+        with frozen_views(self.scene):
+            for annotation in reversed(self.annotations):
+                hide_annotation(self.scene, self.registry, annotation)
+
+
+class DeleteAnnotations(AddAnnotations):
+    def __init__(self, scene, registry, annotations, text="Delete annotations"):
+        super().__init__(scene, registry, annotations, text)
+
+    def redo(self):
+        super().undo()
+
+    def undo(self):
+        super().redo()
+
+
+class MoveItems(QUndoCommand):
+    """`moves` maps item -> (old position, new position)."""
+
+    def __init__(self, moves, text="Move"):
+        super().__init__(text)
+        self.moves = dict(moves)
+
+    def id(self):
+        return MOVE_ID
+
+    def mergeWith(self, other):
+        # Dragging the same items again extends this step instead of adding one
+        if set(other.moves) != set(self.moves):
+            return False
+        for item, (_, new) in other.moves.items():
+            self.moves[item] = (self.moves[item][0], new)
+        return True
+
+    def redo(self):
+        for item, (_, new) in self.moves.items():
+            item.setPos(new)
+
+    def undo(self):
+        for item, (old, _) in self.moves.items():
+            item.setPos(old)
+
+
+class RestyleItems(QUndoCommand):
+    """
+    Sets the font, color and/or pen width of many items in one pass, with the
+    views frozen meanwhile. Text items take font and color, lines take color
+    and pen width; a style an item has no use for is ignored. Remembers each
+    item's old style for undo.
+    """
+
+    def __init__(self, scene, items, font=None, color=None, pen_width=None, text="Change style"):
+        super().__init__(text)
+        self.scene = scene
+        self.old = {item: item_style(item) for item in items}
+        self.style = {key: value for key, value in
+                      (("font", font), ("color", color), ("pen_width", pen_width)) if value is not None}
+
+    def id(self):
+        return RESTYLE_ID
+
+    def mergeWith(self, other):
+        # Only the same kind of change merges: trying several colors in a row is one step,
+        # a color then a font are two
+        if set(other.old) != set(self.old) or set(other.style) != set(self.style):
+            return False
+        self.style.update(other.style)
+        return True
+
+    def redo(self):
+        with frozen_views(self.scene):
+            for item in self.old:
+                set_item_style(item, self.style)
+
+    def undo(self):
+        with frozen_views(self.scene):
+            for item, style in self.old.items():
+                set_item_style(item, style)
+
+
+@contextmanager
+def frozen_views(scene):
+    """No repaint of the scene's views until the block is done, then one."""
+    views = [view for view in scene.views() if view.updatesEnabled()]
+    for view in views:
+        view.setUpdatesEnabled(False)
+    try:
+        yield
+    finally:
+        for view in views:
+            view.setUpdatesEnabled(True)
+            view.viewport().update()
+
+
+def item_style(item):
+    if isinstance(item, QGraphicsTextItem):
+        return {"font": item.font(), "color": item.defaultTextColor()}
+    pen = item.pen()
+    return {"color": pen.color(), "pen_width": pen.widthF()}
+
+
+def set_item_style(item, style):
+    if isinstance(item, QGraphicsTextItem):
+        if "font" in style:
+            item.setFont(style["font"])
+        if "color" in style:
+            item.setDefaultTextColor(style["color"])
+        return
+    if "color" not in style and "pen_width" not in style:
+        return
+    pen = item.pen()
+    if "color" in style:
+        pen.setColor(style["color"])
+    if "pen_width" in style:
+        pen.setWidthF(style["pen_width"])
+    item.setPen(pen)
@@ -0,0 +1,181 @@
+"""
+Multi-image session for the analyzer.
+
+Every image of a session is a SessionImage with its own QGraphicsScene,
+annotations and undo stack: switching images swaps the scene the view
+shows, nothing is rebuilt. All images share one MeasurementStore (rows carry
+their image id), so a whole day of acquisitions exports at once.
+
+Decoded pixels are what costs memory. The workspace keeps those of the most
+recently shown images within a byte budget and drops the others' (their
+annotations stay); showing an evicted image decodes its file again. Images
+acquired in the session have no file, so only their pixmap is dropped and
+their small 8-bit QImage stays. Tiled images keep their own tile budget.
+
+ThumbnailLoader makes the thumbnail strip's icons on a thread pool.
+"""
+import itertools
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, QRect, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+from PyQt5.QtWidgets import QGraphicsPixmapItem, QGraphicsScene, QUndoStack
+
+from .annotations import AnnotationRegistry
+from .measurements import MeasurementStore
+from .tiled_image import TiledImageItem
+
+PIXEL_BUDGET = 512 * 1024 * 1024  # bytes of decoded images (QImage + QPixmap) kept
+THUMBNAIL_SIZE = QSize(128, 96)
+
+
+class SessionImage:
+    def __init__(self, image_id, name, path=None, image=None, source=None, alines=None,
+                 registry=None, undo_limit=100):
+        self.id = image_id
+        self.name = name
+        self.path = path        # file to decode again after an eviction, if any
+        self.image = image      # QImage while decoded (always for acquired images)
+        self.source = source    # tile source of a large image (shown tiled, never evicted)
+        self.alines = alines    # raw echoes behind an acquired image
+        self.scene = QGraphicsScene()
+        self.image_item = None
+        self.annotations = registry if registry is not None else AnnotationRegistry()
+        self.undo_stack = QUndoStack()
+        self.undo_stack.setUndoLimit(undo_limit)
+
+    @property
+    def is_loaded(self):
+        if self.source is not None:
+            return self.image_item is not None
+        return self.image_item is not None and not self.image_item.pixmap().isNull()
+
+    def load(self):
+        """Decodes what an eviction dropped (or everything, the first time)."""
+        if self.is_loaded:
+            return
+        if self.source is not None:
+            self.image_item = TiledImageItem(self.source)
+        else:
+            if self.image is None:
+                self.image = QImage(self.path)
+            pixmap = QPixmap.fromImage(self.image)
+            if self.image_item is None:
+                self.image_item = QGraphicsPixmapItem(pixmap)
+            else:
+                self.image_item.setPixmap(pixmap)
+        if self.image_item.scene() is not self.scene:
+            self.scene.addItem(self.image_item)
+            self.image_item.setZValue(-1)  # Ensure image is behind all other items
+            self.scene.setSceneRect(self.image_item.boundingRect())
+
+    def evict(self):
+        """Frees the decoded pixels; the item, its geometry and the annotations stay."""
+        if self.source is not None or not self.is_loaded:
+            return
+        self.image_item.setPixmap(QPixmap())
+        if self.path is not None:
+            self.image = None
+
+    def pixel_bytes(self):
+        if self.source is not None or not self.is_loaded:
+            return 0
+        pixmap = self.image_item.pixmap()
+        size = pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+        if self.path is not None and self.image is not None:
+            size += self.image.sizeInBytes()  # acquired images keep theirs anyway
+        return size
+
+    def close(self):
+        if isinstance(self.image_item, TiledImageItem):
+            self.image_item.stop()
+
+
+class Workspace:
+    def __init__(self, budget=PIXEL_BUDGET, undo_limit=100):
+        self.budget = budget
+        self.undo_limit = undo_limit
+        self.images = OrderedDict()  # id -> SessionImage, least recently shown first
+        self.measurements = MeasurementStore()
+        self.annotation_ids = itertools.count()  # shared, ids are unique in the store
+        self.image_ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.images)
+
+    def __iter__(self):
+        return iter(self.images.values())
+
+    def new_registry(self):
+        return AnnotationRegistry(self.measurements, self.annotation_ids)
+
+    def add(self, name, path=None, image=None, source=None, alines=None):
+        entry = SessionImage(next(self.image_ids), name, path, image, source, alines,
+                             self.new_registry(), self.undo_limit)
+        self.images[entry.id] = entry
+        return entry
+
+    def get(self, image_id):
+        return self.images.get(image_id)
+
+    def show(self, entry):
+        """Makes `entry` the most recent image, decoded, and evicts the oldest ones over budget."""
+        entry.load()
+        self.images.move_to_end(entry.id)
+        used = sum(e.pixel_bytes() for e in self.images.values())
+        for other in list(self.images.values())[:-1]:
+            if used <= self.budget:
+                break
+            freed = other.pixel_bytes()
+            other.evict()
+            used -= freed
+
+    def pixel_bytes(self):
+        return sum(e.pixel_bytes() for e in self.images.values())
+
+    def close(self):
+        for entry in self.images.values():
+            entry.close()
+
+
+def read_thumbnail(entry, size=THUMBNAIL_SIZE):
+    """Thumbnail QImage of a session image, decoding as little as the format allows."""
+    if entry.source is not None:
+        source = entry.source
+        full = QSize(source.width, source.height).scaled(size, Qt.KeepAspectRatio)
+        return source.decode(QRect(0, 0, source.width, source.height), full)
+    image = entry.image  # once: the GUI thread may evict it meanwhile
+    if image is not None:
+        return image.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    reader = QImageReader(entry.path)
+    reader.setScaledSize(reader.size().scaled(size, Qt.KeepAspectRatio))
+    return reader.read()
+
+
+class _ThumbnailJob(QRunnable):
+    def __init__(self, loader, entry):
+        super().__init__()
+        self.loader = loader
+        self.entry = entry
+
+    def run(self):
+        self.loader._done.emit(self.entry.id, read_thumbnail(self.entry, self.loader.size))
+
+
+class ThumbnailLoader(QObject):
+    ready = pyqtSignal(int, object)  # image id, QImage (on the GUI thread)
+    _done = pyqtSignal(int, object)
+
+    def __init__(self, size=THUMBNAIL_SIZE, max_threads=1, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._done.connect(self.ready)
+
+    def request(self, entry):
+        self.pool.start(_ThumbnailJob(self, entry))
+
+    def stop(self):
+        self.pool.clear()
+        self.pool.waitForDone()
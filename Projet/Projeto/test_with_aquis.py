@@ -1,68 +1,91 @@
 import os
-# import pygetwindow as gw #for windows
-import pyautogui as gui #for linux
 import time
-import subprocess
-from PIL import ImageGrab
+import serial.tools.list_ports
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QGraphicsView, QGraphicsScene,
+    QApplication, QMainWindow, QGraphicsView,
     QPushButton, QFileDialog, QDockWidget, QVBoxLayout, QWidget, QMessageBox, QGraphicsTextItem,
-    QGraphicsLineItem, QColorDialog, QFontDialog, QMessageBox, QShortcut, QLineEdit, QInputDialog
+    QGraphicsLineItem, QColorDialog, QFontDialog, QMessageBox, QShortcut, QLineEdit, QInputDialog,
+    QProgressBar, QListWidget, QListWidgetItem, QListView
 )
-from PyQt5.QtGui import QPixmap, QPen, QColor, QFont, QImage, QPainter
-from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QPixmap, QPen, QColor, QFont, QImage, QPainter, QIcon
+from PyQt5.QtCore import Qt, QPointF, QRect, QRectF, QEvent, QSize
 from PyQt5.QtGui import QKeySequence
-import pyscreenshot as ImageGrab
-
-class Data:
-    def __init__(self, name, value):
-        self.name = name
-        self.value = value
-    
-    def to_dict(self):
-        return {"name": self.name, "value": self.value}
-    
-def get_windows_with_title(title):
-        # Exécuter wmctrl pour lister toutes les fenêtres
-        result = subprocess.run(['wmctrl', '-l'], 
-        capture_output=True, text=True)
-        
-        # Filtrer les fenêtres qui correspondent au titre (insensible à la casse)
-        windows = []
-        for line in result.stdout.splitlines():
-            if title.lower() in line.lower():
-                windows.append(line)
-        return windows
+from sonolib.assets import AssetStore, file_key, pixel_key, relative_url
+from sonolib.echoes import MM_PER_UNIT, caliper_name, caliper_points, find_calipers, sample_alines, scanned_lines
+from sonolib.export import draw_grid
+from sonolib.image_writer import ImageWriter
+from sonolib.persistence import SweepBuffer
+from sonolib.qimage_bridge import CHANNELS, array_to_qimage, qimage_view
+from sonolib.report import ASSET_DIR, gray_statistics, report_html
+from sonolib.sweep_capture import SweepCapture
+from sonolib.tiled_image import PyramidBuilder, TiledImageItem, open_image_source, tile_source
+from sonolib.workspace import THUMBNAIL_SIZE, SessionImage, ThumbnailLoader, Workspace
+from sonolib.undo import AddAnnotations, DeleteAnnotations, MoveItems, RestyleItems
 
 class ImageAnalyzer(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.setWindowTitle("Image Analyzer with Processing Integration")
+        self.setWindowTitle("Image Analyzer")
         self.setGeometry(100, 100, 800, 600)
 
         # Initialize Graphics View and Scene
         self.view = QGraphicsView(self)
-        self.scene = QGraphicsScene(self)
-        self.view.setScene(self.scene)
         self.setCentralWidget(self.view)
-        self.image_item = None
-
-         # Undo/Redo Stacks
-        self.undo_stack = []
-        self.redo_stack = []
-
-        # data dict
-        self.dict = {}
-        self.dict_index = 0
+        self.LARGE_IMAGE = 4096 * 4096  # pixels from which a file is shown as decoded-on-demand tiles
+        self.SNAPSHOT_SIZE = 4096  # longest side of scene snapshots (report images, saved images)
+
+        # Undo/Redo: one command per edit; only the last UNDO_LIMIT are kept per image,
+        # which also bounds the deleted items held for undo
+        self.UNDO_LIMIT = 100
+        self.move_start = {}  # item -> position when a drag started
+
+        # Session: every image has its own scene, annotations (text boxes,
+        # measurement line + label + record) and undo stack; the measurements
+        # of all images share one columnar store. Decoded pixels of the images
+        # not shown are kept up to PIXEL_BUDGET bytes, the rest is decoded again.
+        self.PIXEL_BUDGET = 512 * 1024 * 1024
+        self.workspace = Workspace(self.PIXEL_BUDGET, self.UNDO_LIMIT)
+        self.measurements = self.workspace.measurements
+        self.thumbnails = ThumbnailLoader(parent=self)
+        self.thumbnails.ready.connect(self.on_thumbnail_ready)
+        self.thumbnail_items = {}  # image id -> QListWidgetItem
+
+        # Large PNG/BMP/TIFF files: tile pyramid built in the background, the
+        # image is shown as soon as it exists and fills up as the file is read
+        self.pyramids = PyramidBuilder(parent=self)
+        self.pyramids.started.connect(self.on_pyramid_started)
+        self.pyramids.progress.connect(self.on_pyramid_progress)
+        self.pyramids.ready.connect(self.on_pyramid_ready)
+        self.pyramids.failed.connect(self.on_pyramid_failed)
+        self.building = {}  # file path -> whether to show it, then its session image
+
+        # Until an image is opened, an empty scene (image id 0) to draw on
+        scratch = SessionImage(0, "Untitled", registry=self.workspace.new_registry(), undo_limit=self.UNDO_LIMIT)
+        scratch.scene.installEventFilter(self)
+        self.activate(scratch)
         
         # Current Styles
         self.current_line_color = QColor(Qt.white)
+        self.current_line_width = 2
         self.current_text_font = QFont("Arial", 12)
         self.current_text_color = QColor(Qt.white)
 
-        # Toolbar and Sidebar
+        # Acquisition directly from the serial port
+        self.capture = None
+        self.serial_port = None
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+
+        # Scene snapshots are encoded and written in the background
+        self.PNG_COMPRESSION = 1  # 0 = fastest ... 9 = smallest files
+        self.image_writer = ImageWriter(self.PNG_COMPRESSION, parent=self)
+
+        # Toolbar, Sidebar and thumbnail strip
         self.init_toolbar()
         self.init_sidebar()
+        self.init_session_strip()
 
         # Atalhos de Teclado
         self.init_shortcuts()
@@ -74,10 +97,10 @@ class ImageAnalyzer(QMainWindow):
         open_image_btn.clicked.connect(self.open_image)
         self.addToolBar("Main").addWidget(open_image_btn)
 
-        # Button to acquire image from Processing
-        acquire_image_btn = QPushButton("Acquire Image", self)
-        acquire_image_btn.clicked.connect(self.acquire_image_from_processing)
-        self.addToolBar("Main").addWidget(acquire_image_btn)
+        # Button to acquire one sweep from the serial port
+        self.acquire_image_btn = QPushButton("Acquire Image", self)
+        self.acquire_image_btn.clicked.connect(self.acquire_image)
+        self.addToolBar("Main").addWidget(self.acquire_image_btn)
 
     def init_sidebar(self):
         self.sidebar = QDockWidget("Tools", self)
@@ -101,6 +124,11 @@ class ImageAnalyzer(QMainWindow):
         measure_distance_btn.clicked.connect(self.activate_measure_distance)
         sidebar_layout.addWidget(measure_distance_btn)
 
+        # Automatic measurement of every structure found in the echoes
+        auto_measure_btn = QPushButton("Auto Measure")
+        auto_measure_btn.clicked.connect(self.auto_measure)
+        sidebar_layout.addWidget(auto_measure_btn)
+
         # Delete Selected Button
         delete_selected_btn = QPushButton("Delete Selected")
         delete_selected_btn.clicked.connect(self.delete_selected_items)
@@ -116,11 +144,21 @@ class ImageAnalyzer(QMainWindow):
         change_font_btn.clicked.connect(self.change_text_font)
         sidebar_layout.addWidget(change_font_btn)
 
+        # change line width button
+        change_width_btn = QPushButton("Change Line Width")
+        change_width_btn.clicked.connect(self.change_line_width)
+        sidebar_layout.addWidget(change_width_btn)
+
         # Save image button
         save_image_btn = QPushButton("Save image")
         save_image_btn.clicked.connect(self.save_image)
         sidebar_layout.addWidget(save_image_btn)
 
+        # Export measurements button
+        export_measurements_btn = QPushButton("Export Measurements")
+        export_measurements_btn.clicked.connect(self.export_measurements)
+        sidebar_layout.addWidget(export_measurements_btn)
+
         # Generate HTML report button
         generate_html = QPushButton("Generate report")
         generate_html.clicked.connect(self.generate_report)
@@ -130,6 +168,19 @@ class ImageAnalyzer(QMainWindow):
         self.sidebar.setWidget(sidebar_widget)
         self.addDockWidget(Qt.RightDockWidgetArea, self.sidebar)
 
+    def init_session_strip(self):
+        self.session_dock = QDockWidget("Session", self)
+        self.session_dock.setAllowedAreas(Qt.BottomDockWidgetArea)
+        self.thumbnail_list = QListWidget()
+        self.thumbnail_list.setViewMode(QListView.IconMode)
+        self.thumbnail_list.setFlow(QListView.LeftToRight)
+        self.thumbnail_list.setWrapping(False)
+        self.thumbnail_list.setIconSize(THUMBNAIL_SIZE)
+        self.thumbnail_list.setFixedHeight(THUMBNAIL_SIZE.height() + 48)
+        self.thumbnail_list.currentItemChanged.connect(self.on_thumbnail_selected)
+        self.session_dock.setWidget(self.thumbnail_list)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.session_dock)
+
     def init_shortcuts(self):
         # Atalhos para desfazer, refazer e deletar
         QShortcut(QKeySequence("Ctrl+Z"), self).activated.connect(self.undo)
@@ -138,110 +189,208 @@ class ImageAnalyzer(QMainWindow):
 
 
     def open_image(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "Open Image", "", "Image Files (*.png *.jpg *.bmp)")
-        if file_name:
-            self.load_image(file_name)
+        file_names, _ = QFileDialog.getOpenFileNames(self, "Open Images", "", "Image Files (*.png *.jpg *.bmp *.tif *.npy)")
+        # All go to the session; only the last one is decoded now, the strip shows the others
+        for i, file_name in enumerate(file_names):
+            self.load_image(file_name, show=i == len(file_names) - 1)
 
 
-    def load_image(self, file_path):
+    def load_image(self, file_path, show=True):
         """
-        Loads an image file into the QGraphicsScene.
+        Adds an image file to the session (decoded when shown). Large files
+        (and .npy arrays, memory mapped) are shown as tiles decoded in the
+        background as the view reaches them; a large PNG, BMP or TIFF is
+        converted once into a tile pyramid for that, in the background too
+        (the image joins the session as soon as the pyramid exists).
         """
-        pixmap = QPixmap(file_path)
-        if not pixmap.isNull():
-            if self.image_item:
-                self.scene.removeItem(self.image_item)
-            self.image_item = self.scene.addPixmap(pixmap)
-            self.image_item.setZValue(-1)  # Ensure image is behind all other items
-            self.scene.setSceneRect(QRectF(pixmap.rect()))  # Convert QRect to QRectF
-            self.save_scene_as_image("temp/before.png")
-            print("Image successfully added to the scene.")
+        try:
+            source = open_image_source(file_path)
+            large = source.width * source.height >= self.LARGE_IMAGE or file_path.lower().endswith(".npy")
+            if large:
+                source = tile_source(source)
+        except (ValueError, OSError) as e:
+            print(f"Failed to load image: {e}")
+            return
+        name = os.path.basename(file_path)
+        if large and source is None:
+            if file_path not in self.building:
+                self.building[file_path] = show
+                self.statusBar().showMessage(f"Preparing tiles of {name}...")
+                self.pyramids.build(file_path)
+            return
+        if large:
+            entry = self.workspace.add(name, path=file_path, source=source)
         else:
-            print("Failed to load image.")
-
-    def capture_processing_window(self, window_title, output_file):
+            entry = self.workspace.add(name, path=file_path)
+        self.add_to_session(entry, show)
+
+    def on_pyramid_started(self, file_path, source):
+        entry = self.workspace.add(os.path.basename(file_path), path=file_path, source=source)
+        show = self.building[file_path]
+        self.building[file_path] = entry
+        self.add_to_session(entry, show)
+
+    def on_pyramid_progress(self, file_path, top, bottom):
+        entry = self.building.get(file_path)
+        if entry is not None and entry.image_item is not None:
+            entry.image_item.refresh(QRect(0, top, entry.source.width, bottom - top))
+
+    def on_pyramid_ready(self, file_path, source):
+        entry = self.building.pop(file_path)
+        self.thumbnails.request(entry)  # the first one was made while the pyramid filled up
+        self.statusBar().clearMessage()
+
+    def on_pyramid_failed(self, file_path, message):
+        self.building.pop(file_path, None)
+        self.statusBar().clearMessage()
+        print(f"Failed to load image: {message}")
+
+    def set_image(self, image, name="Acquired image", alines=None):
         """
-        Captures a screenshot of the specified window by title.
+        Adds a QImage to the session and shows it as the image under analysis.
         """
-        # Locate the window by title
-        # windows = gw.getWindowsWithTitle(window_title)
-        window = get_windows_with_title(window_title)[0]
-        print("window title is:", window_title )
-        if not window:
-            print(f"No window with title '{window_title}' found.")
-            return False
-
-        # Get the first matching window
-        # window = windows[0]
-        print(f"Capturing window: {window_title}")
-        #sleep(5)
-        #imagem = ImageGrab.grab()
-        #imagem.save('processing_screenshot.png', 'png')
-        
-        import os
-        os.system('import -window $(xdotool getwindowfocus) -pause 5 processing_screenshot.png ; sleep 1;')
-
-        
-        # x1, y1, x2, y2 = window.left, window.top, window.left + window.width, window.top + window.height
-        # Capture the specified window
-        
-        # im = ImageGrab.grab(bbox=(x1, y1, x2, y2))
-        # im.show()
-        # Get the bounding box of the window
-        # bbox = (window.left, window.top, window.right, window.bottom)
-
-        # Capture the screen within the bounding box
-        # screenshot = ImageGrab.grab()
-        # screenshot.save(output_file)
-        # print(f"Screenshot saved to {output_file}")
+        self.add_to_session(self.workspace.add(name, image=image, alines=alines))
+        print("Image successfully added to the scene.")
+
+    def add_to_session(self, entry, show=True):
+        entry.scene.installEventFilter(self)
+        item = QListWidgetItem(entry.name)
+        item.setData(Qt.UserRole, entry.id)
+        item.setSizeHint(THUMBNAIL_SIZE + QSize(16, 40))
+        self.thumbnail_items[entry.id] = item
+        self.thumbnail_list.addItem(item)
+        self.thumbnails.request(entry)
+        if show:
+            self.show_session_image(entry)
+            if entry.source is not None:
+                self.view.fitInView(self.image_item, Qt.KeepAspectRatio)
+                print(f"Large image opened ({entry.source.width} x {entry.source.height} px), tiles load on demand.")
+
+    def show_session_image(self, entry):
+        """Switches the view, the tools and the undo history to another image of the session."""
+        self.workspace.show(entry)  # decodes it again if it was evicted
+        self.activate(entry)
+        self.thumbnail_list.blockSignals(True)
+        self.thumbnail_list.setCurrentItem(self.thumbnail_items[entry.id])
+        self.thumbnail_list.blockSignals(False)
+
+    def activate(self, entry):
+        self.current = entry
+        self.scene = entry.scene
+        self.annotations = entry.annotations
+        self.undo_stack = entry.undo_stack
+        self.image = entry.image  # QImage of the image under analysis, for pixel access
+        self.image_item = entry.image_item
+        self.alines = entry.alines  # raw echoes (angles x bins) behind an acquired image
+        self.image_id = entry.id  # source image of new measurements
+        self.move_start = {}
+        self.first_point = None
+        self.view.setScene(self.scene)
 
-        return True
-    
-    def acquire_image_from_processing(self):
-        # Path to the Processing sketch
-        processing_sketch_path = r"ultrasonogram_viewer/ultrasonogram_viewer.pde"
+    def store_image(self, image, store):
+        """
+        Path of a QImage in a report asset store, named after its pixels; it
+        is encoded and written in the background only if not stored yet.
+        """
+        if image.format() not in CHANNELS:
+            image = image.convertToFormat(QImage.Format_ARGB32)
+        path, missing = store.reserve(pixel_key(qimage_view(image, writable=False), image.format()))
+        if missing and not self.image_writer.is_writing(path):
+            self.image_writer.save(image, path, self.on_scene_saved)
+        return path
+
+    def save_before_image(self, store):
+        # The image itself, before analysis; returns where it is stored (None without an image)
+        if self.image is not None:
+            return self.store_image(self.image, store)
+        if not isinstance(self.image_item, TiledImageItem):
+            return None
+        # Too large to hash: its overview is stored as a variant of the file, decoded off the GUI thread
+        path, missing = store.reserve(file_key(self.workspace.get(self.image_id).path), self.SNAPSHOT_SIZE)
+        if missing and not self.image_writer.is_writing(path):
+            item = self.image_item
+
+            def save_overview(image):
+                item.overview_ready.disconnect(save_overview)  # one report, one save
+                self.image_writer.save(image, path, self.on_scene_saved)
+
+            item.overview_ready.connect(save_overview)
+            item.request_overview(self.SNAPSHOT_SIZE)
+        return path
+
+    def on_thumbnail_selected(self, item, previous):
+        if item is not None:
+            entry = self.workspace.get(item.data(Qt.UserRole))
+            if entry is not self.current:
+                self.show_session_image(entry)
+
+    def on_thumbnail_ready(self, image_id, image):
+        if image_id in self.thumbnail_items and not image.isNull():
+            self.thumbnail_items[image_id].setIcon(QIcon(QPixmap.fromImage(image)))
+
+    def select_serial_port(self):
+        ports = [port.device for port in serial.tools.list_ports.comports()]
+        if self.serial_port and self.serial_port not in ports:
+            ports.insert(0, self.serial_port)
+        # Editable, so a pty from sonolib.replay can be typed in
+        port, ok = QInputDialog.getItem(self, "Acquire Image", "Serial port:", ports, 0, True)
+        return port if ok and port else None
+
+    def acquire_image(self):
+        """
+        Reads sweeps from the serial port and shows the first complete one,
+        scan-converted in-process. Clicking again cancels.
+        """
+        if self.capture is not None and self.capture.is_running:
+            self.capture.stop()
+            self.end_acquisition("Acquisition canceled.")
+            return
 
-        # Check if the sketch exists
-        if not os.path.exists(processing_sketch_path):
-            QMessageBox.critical(self, "Error", f"Sketch not found: {processing_sketch_path}")
+        port_name = self.select_serial_port()
+        if not port_name:
             return
+        self.serial_port = port_name
 
-        # Run the Processing sketch
+        self.capture = SweepCapture(port_name, parent=self)
+        self.capture.progress.connect(self.progress_bar.setValue)
+        self.capture.finished.connect(self.on_sweep_captured)
+        self.capture.failed.connect(self.on_acquisition_failed)
         try:
-            print("Running Processing sketch...")
-            subprocess.Popen([r"processing-4.3.1/processing-java", "--sketch=" + os.path.dirname(processing_sketch_path), "--run"])
-
-            # QMessageBox.information(self, "Acquisition Started", "Processing sketch is running. Please wait.")
-
-            # Wait for the Processing window to appear
-            window_title = "ultrasonogram_viewer"  # Modify this to match the window title
-            max_retries = 20  # Retry up to 20 times (total ~10 seconds)
-            retry_interval = 3  # Time to wait between retries (0.5 seconds)
-
+            self.capture.start()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to connect to {port_name}: {e}")
+            return
 
-            for _ in range(max_retries):
-                # windows = gw.getWindowsWithTitle(window_title)
-                windows = get_windows_with_title(window_title)
-                if windows:
-                    print("Processing window found.")
-                    break
-                time.sleep(retry_interval)
-            else:
-                QMessageBox.warning(self, "Error", f"Window with title '{window_title}' not found.")
-                return
-            # Delay to ensure the window is fully loaded
-            time.sleep(10)  # Wait 2 seconds after detecting the window
-            # Capture screenshot of the Processing window
-            output_file = r"processing_screenshot.png"
-            if self.capture_processing_window(window_title, output_file):
-                self.load_image(output_file)
-            else:
-                QMessageBox.critical(self, "Error", f"Failed to capture the Processing window.")
+        self.acquire_image_btn.setText("Cancel Acquisition")
+        self.progress_bar.show()
+        self.statusBar().showMessage(f"Waiting for a full sweep on {port_name}...")
+
+    def on_sweep_captured(self, image):
+        sweeps = SweepBuffer()
+        sweeps.add_frames(self.capture.sweep)
+        name = f"Acquisition {time.strftime('%H:%M:%S')}"
+        self.set_image(array_to_qimage(image), name, sweeps.data)  # shares the rendered array, no copy
+        self.end_acquisition("Image acquired.")
+
+    def on_acquisition_failed(self, message):
+        self.end_acquisition(message)
+        QMessageBox.critical(self, "Error", message)
+
+    def end_acquisition(self, message):
+        self.acquire_image_btn.setText("Acquire Image")
+        self.progress_bar.hide()
+        self.statusBar().showMessage(message, 5000)
+        print(message)
+
+    def closeEvent(self, event):
+        if self.capture is not None:
+            self.capture.stop()
+        self.thumbnails.stop()
+        self.pyramids.stop()  # unfinished pyramids are removed
+        self.workspace.close()  # no tile decode may report to a deleted item
+        self.image_writer.wait_for_done()  # don't lose saves still being written
+        super().closeEvent(event)
 
-        except subprocess.CalledProcessError as e:
-            QMessageBox.critical(self, "Error", f"Failed to run Processing sketch.\n\n{e}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An unexpected error occurred.\n\n{e}")
     def activate_add_text(self):
         self.adding_text = True
         self.measuring_distance = False
@@ -266,10 +415,8 @@ class ImageAnalyzer(QMainWindow):
             self.current_text_color = color
             print(f"Text color changed to: {color.name()}")
 
-            # Aplicar a nova cor a todas as caixas de texto existentes
-            for item in self.scene.items():
-                if isinstance(item, QGraphicsTextItem):
-                    item.setDefaultTextColor(self.current_text_color)
+            # Aplicar a nova cor a todas as caixas de texto existentes (um só passo de desfazer)
+            self.restyle(self.annotations.labels(), color=color, text="Change text color")
 
 
     def add_text_item(self, position):
@@ -280,59 +427,84 @@ class ImageAnalyzer(QMainWindow):
         text_item.setFlag(QGraphicsTextItem.ItemIsMovable)
         text_item.setFlag(QGraphicsTextItem.ItemIsSelectable)
         text_item.setTextInteractionFlags(Qt.TextEditorInteraction)
-        self.scene.addItem(text_item)
+        annotation = self.annotations.new("text", [text_item])
 
-        # Adiciona ação no undo_stack
-        self.undo_stack.append(("add_text", text_item))
-        self.redo_stack.clear()  # Limpa o redo_stack ao fazer uma nova ação
+        # O comando adiciona a caixa à cena e ao registro
+        self.undo_stack.push(AddAnnotations(self.scene, self.annotations, [annotation], "Add text"))
 
     def add_distance_point(self, position):
         if self.first_point is None:
             self.first_point = position
             print(f"First point set at: {position}")
         else:
-            line = QGraphicsLineItem(self.first_point.x(), self.first_point.y(), position.x(), position.y())
-            pen = QPen(self.current_line_color, 2)
-            line.setPen(pen)
-            line.setFlag(QGraphicsLineItem.ItemIsSelectable)
-            self.scene.addItem(line)
-
-            # Calcula a distância
+            # Calcula a distância; the image has 1 pixel per scene unit of the radar
             distance = ((position.x() - self.first_point.x())**2 + (position.y() - self.first_point.y())**2)**0.5
+            distance = distance * MM_PER_UNIT
 
-            # convert in mm regarding the screen
-
-            # Récupération de la résolution de l'écran en DPI
-            screen = QApplication.primaryScreen()
-            dpi = screen.physicalDotsPerInch()
-
-            # Conversion de pixels en millimètres
-            distance = distance / dpi * 25.4 * 4.6
-            # convert in mm regarding the screen
-
-            distance_text = QGraphicsTextItem(f"{distance:.2f} mm")
-            midpoint = QPointF((self.first_point.x() + position.x()) / 2, (self.first_point.y() + position.y()) / 2)
-            distance_text.setPos(midpoint)
-            distance_text.setFont(self.current_text_font)
-            distance_text.setDefaultTextColor(self.current_line_color)
-            distance_text.setFlag(QGraphicsTextItem.ItemIsMovable)
-            distance_text.setFlag(QGraphicsTextItem.ItemIsSelectable)
-            self.scene.addItem(distance_text)
+            annotation = self.new_measurement(self.first_point, position, distance)
+            for item in annotation.items:
+                self.scene.addItem(item)  # shown while it is named
             # save the distance
             # name it
             text, pressed = QInputDialog.getText(window, "Input Text", "Enter the easurement name:", QLineEdit.Normal, "")
             print(text)
-            new_data = Data(text, distance_text.toPlainText())
-             # Ajout au dictionnaire avec une clé unique
-            self.dict[self.dict_index] = new_data.to_dict()
-            self.dict_index += 1
-
-            # Adiciona ações no undo_stack
-            self.undo_stack.append(("add_line", line, distance_text))
-            self.redo_stack.clear()  # Limpa o redo_stack ao fazer uma nova ação
+            annotation.record["name"] = text
+             # Ajout au registre (et à self.measurements) avec la clé de l'annotation, via la pile d'annulation
+            self.undo_stack.push(AddAnnotations(self.scene, self.annotations, [annotation], "Add measurement"))
 
             self.first_point = None
 
+    def new_measurement(self, start, end, distance, name=""):
+        """Line and distance label between two scene points, as an annotation not added yet."""
+        line = QGraphicsLineItem(start.x(), start.y(), end.x(), end.y())
+        pen = QPen(self.current_line_color, self.current_line_width)
+        line.setPen(pen)
+        line.setFlag(QGraphicsLineItem.ItemIsSelectable)
+
+        distance_text = QGraphicsTextItem(f"{distance:.2f} mm")
+        midpoint = QPointF((start.x() + end.x()) / 2, (start.y() + end.y()) / 2)
+        distance_text.setPos(midpoint)
+        distance_text.setFont(self.current_text_font)
+        distance_text.setDefaultTextColor(self.current_line_color)
+        distance_text.setFlag(QGraphicsTextItem.ItemIsMovable)
+        distance_text.setFlag(QGraphicsTextItem.ItemIsSelectable)
+        record = {"name": name, "start": (start.x(), start.y()), "end": (end.x(), end.y()),
+                  "length_mm": float(distance), "image_id": self.image_id}
+        return self.annotations.new("measurement", [line, distance_text], record)
+
+    def auto_measure(self):
+        """
+        Finds the echo boundaries on every A-line and measures each structure
+        (from a surface to the next echo behind it) in one undoable step. Uses
+        the raw echoes of an acquired sweep, or reads the A-lines back from
+        the pixels of a loaded image (radar origin at the bottom centre).
+        """
+        if self.image is None:
+            QMessageBox.warning(self, "Auto Measure", "Open or acquire a radar image first (large tiled images are not supported).")
+            return
+        center = (self.image.width() // 2, self.image.height())
+        if self.alines is not None:
+            alines = self.alines
+            scanned = scanned_lines(alines)
+        else:
+            gray = self.image.convertToFormat(QImage.Format_Grayscale8)
+            grid = draw_grid((self.image.width(), self.image.height()))  # la grille n'est pas un écho
+            alines = sample_alines(qimage_view(gray), center, background=grid)
+            scanned = scanned_lines(alines, 0.5)  # only the grid where nothing was received
+        angle_bounds = len(alines) // 2
+        calipers = find_calipers(alines, range(-angle_bounds, angle_bounds + 1), scanned=scanned)
+        if len(calipers) == 0:
+            QMessageBox.information(self, "Auto Measure", "No structure found.")
+            return
+
+        annotations = []
+        for caliper, (x0, y0, x1, y1) in zip(calipers, caliper_points(calipers, center)):
+            annotations.append(self.new_measurement(QPointF(x0, y0), QPointF(x1, y1),
+                                                    caliper["length_mm"], caliper_name(caliper)))
+        self.undo_stack.push(AddAnnotations(self.scene, self.annotations, annotations,
+                                            f"Auto measure {len(annotations)} structure(s)"))
+        print(f"Auto measure: {len(annotations)} measurement(s) added.")
+
 
     def change_line_color(self):
         color = QColorDialog.getColor()
@@ -340,11 +512,35 @@ class ImageAnalyzer(QMainWindow):
             self.current_line_color = color
             print(f"Line color changed to: {color.name()}")
 
+            # Selected measurements take the new color too
+            items = [item for a in self.selected_measurements() for item in a.items]
+            self.restyle(items, color=color, text="Change line color")
+
     def change_text_font(self):
-        font, ok = QFontDialog.getFont()
+        font, ok = QFontDialog.getFont(self.current_text_font, self)
         if ok:
             self.current_text_font = font
             print(f"Text font changed to: {font.family()}")
+            self.restyle(self.annotations.labels(), font=font, text="Change text font")
+
+    def change_line_width(self):
+        width, ok = QInputDialog.getInt(self, "Line Width", "Line width (px):", self.current_line_width, 1, 20)
+        if ok:
+            self.current_line_width = width
+            print(f"Line width changed to: {width}")
+
+            # Selected measurement lines, or every line when nothing is selected
+            lines = [a.line for a in self.selected_measurements()]
+            self.restyle(lines or self.annotations.items("line"), pen_width=width, text="Change line width")
+
+    def selected_measurements(self):
+        """Measurements with a selected line or label."""
+        return [a for a in self.annotations.for_items(self.scene.selectedItems()) if a.kind == "measurement"]
+
+    def restyle(self, items, font=None, color=None, pen_width=None, text="Change style"):
+        # Toda a mudança num só comando, com a vista congelada durante o lote
+        if items:
+            self.undo_stack.push(RestyleItems(self.scene, items, font, color, pen_width, text))
 
     def delete_selected_items(self):
         selected_items = self.scene.selectedItems()
@@ -358,176 +554,120 @@ class ImageAnalyzer(QMainWindow):
         )
 
         if confirmation == QMessageBox.Yes:
-            actions = []
-
-            for item in selected_items:
-                self.scene.removeItem(item)
-                if isinstance(item, QGraphicsTextItem):
-                    actions.append(("add_text", item))
-                elif isinstance(item, QGraphicsLineItem):
-                    distance_text = next(
-                        (i for i in self.scene.items() if isinstance(i, QGraphicsTextItem) and i.pos() == item.boundingRect().center()),
-                        None
-                    )
-                    actions.append(("add_line", item, distance_text))
-                    if distance_text:
-                        self.scene.removeItem(distance_text)
-
-            self.undo_stack.append(("delete", actions))
-            self.redo_stack.clear()
+            # A line and its label are one annotation: selecting either deletes both
+            annotations = self.annotations.for_items(selected_items)
+            if annotations:
+                # Um único passo de desfazer para toda a seleção
+                self.undo_stack.push(DeleteAnnotations(self.scene, self.annotations, annotations,
+                                                       f"Delete {len(annotations)} annotation(s)"))
             print(f"Deleted {len(selected_items)} item(s).")
 
+    def eventFilter(self, obj, event):
+        # Turn label/text drags in the scene into undoable moves
+        if obj is self.scene:
+            if event.type() == QEvent.GraphicsSceneMousePress and event.button() == Qt.LeftButton:
+                items = set(self.scene.selectedItems())
+                under = self.scene.itemAt(event.scenePos(), self.view.transform())
+                if under is not None:
+                    items.add(under)
+                self.move_start = {item: item.pos() for item in items
+                                   if item.flags() & QGraphicsTextItem.ItemIsMovable}
+            elif event.type() == QEvent.GraphicsSceneMouseRelease and self.move_start:
+                moves = {item: (old, item.pos()) for item, old in self.move_start.items() if item.pos() != old}
+                self.move_start = {}
+                if moves:
+                    self.undo_stack.push(MoveItems(moves))
+        return super().eventFilter(obj, event)
+
     def undo(self):
-        if not self.undo_stack:
+        if not self.undo_stack.canUndo():
             QMessageBox.information(self, "Undo", "Nothing to undo.")
             return
 
-        action = self.undo_stack.pop()
-
-        if action[0] == "add_text":
-            self.scene.removeItem(action[1])
-            self.redo_stack.append(action)
-
-        elif action[0] == "add_line":
-            self.scene.removeItem(action[1])
-            self.scene.removeItem(action[2])
-            self.redo_stack.append(action)
-
-        elif action[0] == "delete":
-            for sub_action in action[1]:
-                if sub_action[0] == "add_text":
-                    self.scene.addItem(sub_action[1])
-                elif sub_action[0] == "add_line":
-                    self.scene.addItem(sub_action[1])
-                    if sub_action[2]:
-                        self.scene.addItem(sub_action[2])
-            self.redo_stack.append(action)
-
+        self.undo_stack.undo()
         print("Undo performed.")
 
     def redo(self):
-        if not self.redo_stack:
+        if not self.undo_stack.canRedo():
             QMessageBox.information(self, "Redo", "Nothing to redo.")
             return
 
-        action = self.redo_stack.pop()
-
-        if action[0] == "add_text":
-            self.scene.addItem(action[1])
-            self.undo_stack.append(action)
-
-        elif action[0] == "add_line":
-            self.scene.addItem(action[1])
-            self.scene.addItem(action[2])
-            self.undo_stack.append(action)
-
-        elif action[0] == "delete":
-            for sub_action in action[1]:
-                if sub_action[0] == "add_text":
-                    self.scene.removeItem(sub_action[1])
-                elif sub_action[0] == "add_line":
-                    self.scene.removeItem(sub_action[1])
-                    if sub_action[2]:
-                        self.scene.removeItem(sub_action[2])
-            self.undo_stack.append(action)
-
+        self.undo_stack.redo()
         print("Redo performed.")
     
-    # Método para salvar a cena como imagem
-    def save_scene_as_image(self, file_path):
+    def image_statistics(self):
+        """
+        Gray level statistics of the image under analysis, computed on its
+        pixels in place (no encode/decode round trip).
+        """
+        if self.image is not None:
+            image = self.image
+        elif isinstance(self.image_item, TiledImageItem):
+            image = self.image_item.overview(2048)  # a tiled image is never decoded whole
+        else:
+            return None
+        bounds = self.image_item.boundingRect()
+        if image.format() not in CHANNELS or image.format() == QImage.Format_Indexed8:
+            image = image.convertToFormat(QImage.Format_Grayscale8)
+        pixels = qimage_view(image)
+        gray = pixels if pixels.ndim == 2 else pixels[..., :3].mean(axis=2)
+        return gray_statistics(gray, (round(bounds.width()), round(bounds.height())))
+
+    # Método para renderizar a cena numa imagem
+    def snapshot_scene(self):
         rect = self.scene.sceneRect()
-        image = QImage(int(rect.width()), int(rect.height()), QImage.Format_ARGB32)
+        # Large scenes are rendered scaled down, never at 20k x 20k
+        scale = min(1.0, self.SNAPSHOT_SIZE / max(rect.width(), rect.height(), 1))
+        image = QImage(max(1, round(rect.width() * scale)), max(1, round(rect.height() * scale)), QImage.Format_ARGB32)
         image.fill(Qt.white)  # Fundo branco
 
         painter = QPainter(image)
-        self.scene.render(painter)
+        self.scene.render(painter, QRectF(image.rect()), rect)
         painter.end()
-        image.save(file_path)
-        
-        print(f"Scene saved as image: {file_path}")
+        return image
+
+    # Método para salvar a cena como imagem
+    def save_scene_as_image(self, file_path, callback=None):
+        # Só a renderização acontece aqui; a codificação e a escrita rodam em segundo plano
+        self.image_writer.save(self.snapshot_scene(), file_path, callback or self.on_scene_saved)
+
+    def on_scene_saved(self, file_path, ok):
+        if ok:
+            print(f"Scene saved as image: {file_path}")
+        else:
+            print(f"Failed to save scene image: {file_path}")
 
     # Método para salvar a imagem quando o botão é clicado
     def save_image(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Image", "", "Image Files (*.png *.jpg)")
         if file_path:
-            self.save_scene_as_image(file_path)
+            self.save_scene_as_image(file_path, self.on_image_saved)
+
+    def on_image_saved(self, file_path, ok):
+        self.on_scene_saved(file_path, ok)
+        if ok:
+            self.statusBar().showMessage(f"Image saved: {file_path}", 5000)
+        else:
+            QMessageBox.critical(self, "Error", f"Failed to save the image: {file_path}")
 
     def generate_html_report(self, file_path):
-        self.save_scene_as_image("temp/after.png") 
         if not file_path: 
             QMessageBox.warning(self, "Error", "No file selected for saving the report.")
             return
 
         try:
-            html_content = """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body {
-                        font-family: sans-serif;
-                        margin: 20px;
-                    }
-
-                    h1, h2 {
-                        text-align: center;
-                    }
-
-                    ul {
-                        list-style-type: none;
-                        padding: 0;
-                    }
-
-                    li {
-                        margin-bottom: 5px;
-                    }
-
-                    img {
-                        display: block;
-                        max-width: 65%;
-                        height: auto; 
-                        margin-bottom: 10px;
-                        margin-left: auto;
-                        margin-right: auto;
-                    }
-
-                    table {
-                    border-collapse: collapse;
-                    width: 80%;
-                    margin-right: auto;
-                    margin-left: auto;
-                    }
-
-                    th, td {
-                    border: 1px solid #ddd;
-                    padding: 8px;
-                    text-align: left;
-                    }
-
-                    th {
-                    background-color: #f2f2f2;
-                    text-align: center; /* Centre le texte horizontalement */
-                    font-weight: bold; /* Met le texte en gras */
-                    }
-                </style>
-            </head>
-            <body>
-                <h1>Scene Report</h1>
-                <img src="temp/before.png" alt="Image Load">
-                <hr width="100%" size="2">
-                <h2>Measurement Report</h2>
-                <table>"""
-            # Add data from self.dict (assuming the structure is as described)
-            html_content += f"<tr><th>Measurement</th><th>Size</th></tr>"
-            for a, distance in self.dict.items():
-                html_content += f"<tr><td>{distance['name']}</td><td>{distance['value']}</td></tr>"
-            html_content += """</table>
-                <hr width="100%" size="2">
-                <h2>Rendered Scene</h2>
-                <img src="temp/after.png" alt="Image after analyse">
-            </body>
-            </html>
-            """
+            # Images in the asset store next to the report (assets/), named after their pixels:
+            # one already stored (unchanged since the last report, or shared with another) is not written again
+            folder = os.path.dirname(file_path)
+            store = AssetStore(os.path.join(folder, ASSET_DIR))
+            before = self.save_before_image(store)
+            after = self.store_image(self.snapshot_scene(), store)
+
+            # Measurements of this image, in creation order (also after undo)
+            rows = self.measurements.table(self.measurements.select(image_id=self.image_id))
+            html_content = report_html("Scene Report", relative_url(before, folder) if before else "",
+                                       relative_url(after, folder),
+                                       zip(rows['name'], rows['length_mm']), self.image_statistics())
 
             with open(file_path, "w", encoding="utf-8") as file:
                 file.write(html_content)
@@ -542,13 +682,30 @@ class ImageAnalyzer(QMainWindow):
     # Método para gerar o relatório HTML quando o botão é clicado
     def generate_report(self):
         # just to test
-        print(self.dict)
+        print(self.measurements.stats())
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Report", "", "HTML Files (*.html)")
         if file_path:  # Proceed only if the user selects a valid path
             self.generate_html_report(file_path)
         else:
             QMessageBox.information(self, "Canceled", "Report generation canceled.")
 
+    def export_measurements(self):
+        """Saves every measurement (all images) as CSV or NPZ, from the file extension."""
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Measurements", "",
+                                                   "CSV Files (*.csv);;NumPy Archives (*.npz)")
+        if not file_path:
+            return
+        try:
+            if file_path.lower().endswith(".npz"):
+                # Image names let the batch reporter match a recording to its image
+                self.measurements.write_npz(file_path, image_names={e.id: e.name for e in self.workspace})
+            else:
+                self.measurements.write_csv(file_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to export the measurements: {e}")
+            return
+        print(f"{len(self.measurements)} measurement(s) exported to: {file_path}")
+
 
 
 if __name__ == "__main__":
@@ -20,6 +20,9 @@
 #define SERVO_PWM_PIN 6
 #define ANGLE_BOUNDS 80
 #define ANGLE_STEP 1
+#define BINARY_FRAMES 0 // 1 = send compact binary frames (87 bytes) instead of CSV text (~300 bytes)
+                        // frame: 0xA5 0x5A, seq, angle (int16 LE), 80 echoes (0..255), CRC16-CCITT (LE)
+#define GAIN_INDEX 80   // amplification is GAIN_INDEX^2: the value the CSV loop used to leave in i for getValues()
 
 int angle = 40;
 int dir = 1;
@@ -27,6 +30,7 @@ int i,j, start;
 float strength[80]; //40 analog readings send to your computer for "Processing" program
 Servo myservo;
 int analog_pin = A0; //analog pin A0 on arduino nano, uno, mega....
+byte seq = 0; //frame counter, lets the computer see lost frames
 
 void setup() 
 {
@@ -41,6 +45,9 @@ void loop(){
 
   if (start == 1){
   getValues();
+#if BINARY_FRAMES
+  sendBinaryFrame(-angle);
+#else
   Serial.print(-angle, DEC);      //first parameter send to your computer for Processing program
   // Pay Attention! There is "-angle" because some servoes may do it in wrong direction. If servo and image
   // on your computer does not match, put there "angle" instead "-angle". This will reverse servo direction                        
@@ -51,6 +58,7 @@ void loop(){
                                   // for visualisation (reading from COMxx port)
    }
   Serial.println(); //not printing anything, just new row, and back to the first place
+#endif
   myservo.write(angle + ANGLE_BOUNDS); //servo should move one step
   if (angle >= ANGLE_BOUNDS-40 || angle <= -ANGLE_BOUNDS+40)
    {
@@ -61,6 +69,39 @@ void loop(){
              // DO NOT go below 10 mS - this value is experimentally get by oscilloscope, else strange "rays" may occur on radar
  }
 
+// CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), same as Python binascii.crc_hqx(data, 0xFFFF)
+unsigned int crc16Update(unsigned int crc, byte b)
+{
+  crc ^= (unsigned int)b << 8;
+  for (byte k = 0; k < 8; k++)
+   {
+     crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+   }
+  return crc;
+}
+
+void sendBinaryFrame(int a)
+{
+  byte frame[87];
+  frame[0] = 0xA5;
+  frame[1] = 0x5A;
+  frame[2] = seq++;
+  frame[3] = a & 0xFF;
+  frame[4] = (a >> 8) & 0xFF;
+  for (int k=0;k<80;k++) // local counters: the globals must not change between frame formats
+   {
+     frame[5 + k] = (byte)constrain(strength[k], 0, 255);
+   }
+  unsigned int crc = 0xFFFF;
+  for (int k=2;k<85;k++)
+   {
+     crc = crc16Update(crc, frame[k]);
+   }
+  frame[85] = crc & 0xFF;
+  frame[86] = (crc >> 8) & 0xFF;
+  Serial.write(frame, 87);
+}
+
 int getValues() //function which read analog echo and return array of analog values
 {
   myservo.detach(); //very important! this command disable PWM - which make interference during analog read
@@ -71,10 +112,11 @@ int getValues() //function which read analog echo and return array of analog val
  // delay(1);//lets avoid crosstalk between emitter and receiver in first millisecond or two
  // NO! let it be: if this delay is added, then whole screen is wrong - missing some components and distorted...
  // As a result of avoiding this delay, "origin" of the radar pulses will be with some false reading, but not a problem
-  for (j=0;j<80;j++) //lets make array of j elements
+  float gain = pow(GAIN_INDEX, 2); // fixed, whatever loop ran last (was pow(i,2) with the global i)
+  for (int j=0;j<80;j++) //lets make array of j elements
    {
  // int str= ((analogRead(analog_pin)*5.00)/1024)*pow(i,2);   // too long to execute, also not using constrain below
-        strength[j]=(analogRead(analog_pin)*0.0025)*pow(i,2); // "dynamic amplification" by exponent^2 of i *5
+        strength[j]=(analogRead(analog_pin)*0.0025)*gain;     // "dynamic amplification" by exponent^2 of i *5
                                                               // Since amplitude of ultrasound fall with square of the distance,
                                                               // "pow(i,2)" is actually i^2 (i squared). You may experiment with
                                                               // additional amplification by factor of 5 in example above
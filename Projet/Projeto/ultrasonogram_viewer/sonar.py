@@ -1,14 +1,20 @@
+import os
+import sys
 import pygame
-import serial
 import math
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sonolib.acquisition import SerialAcquisition
+from sonolib.persistence import SweepBuffer
+from sonolib.recording import SweepRecorder
+from sonolib.scan_convert import ScanConverter
+
 # Initialize constants
 SIDE_LENGTH = 1000
 ANGLE_BOUNDS = 80
-ANGLE_STEP = 2
-HISTORY_SIZE = 10
-POINTS_HISTORY_SIZE = 500
-MAX_DISTANCE = 100
+DOT_SIZE = 4
+PERSISTENCE_MODE = "replace"  # "replace", "decay" or "last_k"
+FPS = 30  # frame-rate cap, independent of the serial rate
 
 # Initialize pygame
 pygame.init()
@@ -17,6 +23,7 @@ pygame.init()
 WIDTH, HEIGHT = 1920, 1024
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Radar Simulation")
+clock = pygame.time.Clock()
 
 # Colors
 BLACK = (0, 0, 0)
@@ -30,70 +37,82 @@ RADIUS = SIDE_LENGTH // 2
 LEFT_ANGLE_RAD = math.radians(-ANGLE_BOUNDS) - math.pi / 2
 RIGHT_ANGLE_RAD = math.radians(ANGLE_BOUNDS) - math.pi / 2
 
-# Data structures
-echoes = [0] * 80
-history = []
-points = [(0, 0)] * POINTS_HISTORY_SIZE
-
-# Initialize angle
-angle = -40
+# Echo image: one 8-bit surface holding the scan-converted sweep buffer,
+# level 0 is the colour key so the grid below shows through
+sweeps = SweepBuffer(ANGLE_BOUNDS, mode=PERSISTENCE_MODE)
+scan = ScanConverter((CENTER_X, CENTER_Y), dot_size=DOT_SIZE, angle_bounds=ANGLE_BOUNDS)
+scan_height, scan_width = scan.shape
+echo_surface = pygame.Surface((scan_width, scan_height), depth=8)
+echo_surface.set_palette([tuple(c * i // 255 for c in GREEN) for i in range(256)])
+echo_surface.set_colorkey(0)
+screen_rect = screen.get_rect()
 
 # Serial setup
-SERIAL_PORT = "/dev/pts/8"
+# Pass the port on the command line, e.g. the pty printed by "python -m sonolib.replay",
+# and optionally a file to record the raw sweeps to: python sonar.py /dev/pts/8 session.swp
+SERIAL_PORT = sys.argv[1] if len(sys.argv) > 1 else "/dev/pts/8"
+RECORD_PATH = sys.argv[2] if len(sys.argv) > 2 else None
 BAUD_RATE = 115200
-ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
+acquisition = SerialAcquisition(SERIAL_PORT, BAUD_RATE,  # reads in its own thread, never blocks the loop
+                                on_error=lambda e: print(f"Serial acquisition stopped: {e}"),
+                                recorder=SweepRecorder(RECORD_PATH) if RECORD_PATH else None)
+acquisition.start()
 
-def draw_radar():
-    pygame.draw.circle(screen, GRAY, (CENTER_X, CENTER_Y), RADIUS, 1)
+def draw_radar(surface):
+    pygame.draw.circle(surface, GRAY, (CENTER_X, CENTER_Y), RADIUS, 1)
     for i in range(0, SIDE_LENGTH // 100):
-        pygame.draw.arc(screen, GRAY, (CENTER_X - 50 * i, CENTER_Y - 50 * i, 100 * i, 100 * i), LEFT_ANGLE_RAD, RIGHT_ANGLE_RAD, 1)
+        pygame.draw.arc(surface, GRAY, (CENTER_X - 50 * i, CENTER_Y - 50 * i, 100 * i, 100 * i), LEFT_ANGLE_RAD, RIGHT_ANGLE_RAD, 1)
 
     for i in range(0, ANGLE_BOUNDS * 2 // 20):
         angle = -ANGLE_BOUNDS + i * 20
         rad_angle = math.radians(angle)
         end_x = CENTER_X + RADIUS * math.sin(rad_angle)
         end_y = CENTER_Y - RADIUS * math.cos(rad_angle)
-        pygame.draw.line(screen, GRAY, (CENTER_X, CENTER_Y), (end_x, end_y), 1)
+        pygame.draw.line(surface, GRAY, (CENTER_X, CENTER_Y), (end_x, end_y), 1)
+
+def compose(rect):
+    """Redraws grid + echoes inside a screen rectangle."""
+    screen.blit(grid_surface, rect, rect)
+    screen.blit(echo_surface, rect, rect.move(-scan.origin[0], -scan.origin[1]))
 
 def draw_objects():
-    for i in range(1, 80):
-        distance = i * 12.5
-        radian = math.radians(angle)
-        x = distance * math.sin(radian)
-        y = distance * math.cos(radian)
-        px, py = int(CENTER_X + x), int(CENTER_Y - y)
-        points[i % POINTS_HISTORY_SIZE] = (px, py)
-
-        for px, py in points:
-            if px != 0 and py != 0:
-                pygame.draw.ellipse(screen, GREEN, (px - 2, py - 2, 4, 4))
-
-def process_serial():
-    global angle
-    line = ser.readline().decode('utf-8').strip()
-    if line:
-        values = line.split(',')
-        try:
-            angle = int(values[0])
-            for i in range(1, 80):
-                echoes[i] = int(values[i])
-        except ValueError:
-            pass
+    """Scan-converts the angles changed since the last frame; returns the screen rect to update."""
+    sweeps.fade()
+    dirty = scan.draw_sweeps(sweeps)
+    if dirty is None:
+        return None
+    x0, y0, x1, y1 = dirty
+    pixels = pygame.surfarray.pixels2d(echo_surface)  # (x, y) view of the surface memory, locks it
+    pixels[x0:x1, y0:y1] = scan.buffer[y0:y1, x0:x1].T
+    del pixels  # a locked surface can't be blitted
+    rect = pygame.Rect(x0 + scan.origin[0], y0 + scan.origin[1], x1 - x0, y1 - y0).clip(screen_rect)
+    if rect.width == 0 or rect.height == 0:
+        return None
+    compose(rect)
+    return rect
+
+# The grid never changes: draw it once
+grid_surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+grid_surface.fill(BLACK)
+draw_radar(grid_surface)
+compose(screen_rect)
+pygame.display.flip()
 
 # Main loop
 running = True
 while running:
-    screen.fill(BLACK)
-
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            running = False
 
-    process_serial()
-    draw_radar()
-    draw_objects()
+    sweeps.add_frames(acquisition.drain())  # everything received since the last frame
+    rect = draw_objects()
+    if rect is not None:
+        pygame.display.update([rect])
 
-    pygame.display.flip()
+    clock.tick(FPS)
 
 pygame.quit()
-ser.close()
+acquisition.stop()